@@ -3,6 +3,20 @@ Defines a SystemConfig class to store solar power system parameters.
 """
 from ZIP_data import get_ZIP_data
 
+# Mounts build_pv_system() knows how to model
+TRACKING_TYPES = ("fixed", "single-axis", "dual-axis")
+
+# Constructor arguments that have defaults, used by from_dict()
+OPTIONAL_FIELDS = {
+    "module_efficiency": 0.20,
+    "system_losses": 0.14,
+    "tilt_deg": 20.0,
+    "azimuth_deg": 180.0,
+    "max_angle": 60.0,
+    "tracking_type": "fixed",
+    "interval_minutes": 60,
+}
+
 class SystemConfig:
     def __init__(self,
         zip_code: str,
@@ -12,7 +26,9 @@ class SystemConfig:
         tilt_deg: float,
         azimuth_deg: float,
         max_angle: float,
-        tracking_type: str = "fixed"
+        tracking_type: str = "fixed",
+        interval_minutes: int = 60,
+        offline_elevation: bool = False
     ):
         self.zip_code = zip_code
         self.system_capacity_kw = system_capacity_kw
@@ -20,18 +36,24 @@ class SystemConfig:
         self.system_losses = system_losses
         self.tilt_deg = tilt_deg
         self.azimuth_deg = azimuth_deg
-        self.tracking_type = tracking_type.lower()
+        self.tracking_type = str(tracking_type).strip().lower()
         self.max_angle = max_angle
+        self.interval_minutes = int(interval_minutes)
 
         # Validation
-        valid_tracking = {"fixed", "single-axis", "dual-axis"}
-        if self.tracking_type not in valid_tracking:
-            raise ValueError(f"tracking_type must be one of {valid_tracking}")
+        if self.tracking_type not in TRACKING_TYPES:
+            raise ValueError(f"tracking_type must be one of {list(TRACKING_TYPES)}, not {tracking_type!r}")
+        valid_intervals = {5, 15, 30, 60}
+        if self.interval_minutes not in valid_intervals:
+            raise ValueError(f"interval_minutes must be one of {valid_intervals}")
 
-        # Get lat/long, elevation, and timezone
-        ZIP_data = get_ZIP_data(zip_code)
+        # Get lat/long, elevation, and timezone (see get_ZIP_data for offline_elevation)
+        ZIP_data = get_ZIP_data(zip_code, offline_elevation=offline_elevation)
+        if ZIP_data is None:
+            raise ValueError(f"Could not find location data for ZIP {zip_code}")
 
-        self.latitude,self.longitude,self.elevation,self.tz = get_ZIP_data(zip_code)
+        # location_source is "nearest" when the ZIP is unknown and a neighboring ZIP's location is used
+        self.latitude,self.longitude,self.elevation,self.tz,self.location_source = ZIP_data
 
 
     def summary(self):
@@ -46,9 +68,64 @@ class SystemConfig:
             f"  Tilt: {self.tilt_deg}°\n"
             f"  Azimuth: {self.azimuth_deg}°\n"
             f"  Tracking: {self.tracking_type.capitalize()}\n"
-            f"  Max angle: {self.max_angle}"
+            f"  Max angle: {self.max_angle}\n"
+            f"  Interval: {self.interval_minutes} min"
+        )
+
+    def cache_key(self) -> tuple:
+        """Hashable key identifying everything that affects the model output."""
+        return (
+            str(self.zip_code), self.system_capacity_kw, self.module_efficiency, self.system_losses,
+            self.tilt_deg, self.azimuth_deg, self.max_angle, self.tracking_type, self.interval_minutes
         )
 
+    def to_dict(self) -> dict:
+        """Constructor arguments as a JSON-friendly dict (inverse of from_dict)."""
+        return {
+            "zip_code": str(self.zip_code),
+            "system_capacity_kw": self.system_capacity_kw,
+            "module_efficiency": self.module_efficiency,
+            "system_losses": self.system_losses,
+            "tilt_deg": self.tilt_deg,
+            "azimuth_deg": self.azimuth_deg,
+            "max_angle": self.max_angle,
+            "tracking_type": self.tracking_type,
+            "interval_minutes": self.interval_minutes,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SystemConfig":
+        """
+        Builds a SystemConfig from a dict such as a parsed JSON request.
+        zip_code and system_capacity_kw are required; other fields use OPTIONAL_FIELDS.
+        Raises ValueError for missing, unknown or non-numeric fields.
+        """
+        # JSON null means "use the default"
+        data = {key: value for key, value in data.items() if value is not None}
+        missing = [field for field in ("zip_code", "system_capacity_kw") if data.get(field) is None]
+        if missing:
+            raise ValueError(f"Missing required fields: {missing}")
+        unknown = set(data) - {"zip_code", "system_capacity_kw"} - set(OPTIONAL_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown fields: {sorted(unknown)}")
+
+        fields = {**OPTIONAL_FIELDS, **data}
+        try:
+            arguments = dict(
+                zip_code=str(fields["zip_code"]),
+                system_capacity_kw=float(fields["system_capacity_kw"]),
+                module_efficiency=float(fields["module_efficiency"]),
+                system_losses=float(fields["system_losses"]),
+                tilt_deg=float(fields["tilt_deg"]),
+                azimuth_deg=float(fields["azimuth_deg"]),
+                max_angle=float(fields["max_angle"]),
+                tracking_type=str(fields["tracking_type"]),
+                interval_minutes=int(fields["interval_minutes"]),
+            )
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid system configuration: {e}") from e
+        return cls(**arguments)
+
     def __repr__(self):
         """Readable representation for debugging."""
         return (
@@ -1,13 +1,23 @@
 # Main purpose is to defin get_ZIP_data function
 # Input = ZIP
-# Outut = latitude, longitude, elevation (meters), timezone
-# Tries two different methods to get latitude/longitude. First, looks in uszips file. Then tries with geolocator.
+# Outut = latitude, longitude, elevation (meters), timezone, location source (see geocoder.py)
+# Latitude/longitude come from the offline geocoder (local centroid tables). Only unknown ZIPs go to Nominatim.
 
-import pandas as pd
 import requests
-from geopy.geocoders import Nominatim
-from config import DATA_DIR
+from pvlib.location import lookup_altitude
 from timezonefinderL import TimezoneFinder
+from geocoder import geocode_zip, geocode_zips, normalize_zip
+from caches import NamedCache
+from rate_limit import RateLimiter
+
+ELEVATION_URL = "https://api.open-meteo.com/v1/elevation"
+
+# Open-Meteo allows roughly 600 requests per minute on the free tier
+elevation_rate_limiter = RateLimiter("open-meteo", min_interval=0.1)
+ELEVATION_TIMEOUT_SECONDS = 5
+
+# ZIP --> (lat, lon, elevation, timezone). Locations never change, so no TTL.
+location_cache = NamedCache("zip_location", maxsize=50000)
 
 # Start by defining two functions that are called after lat/long are found.
 
@@ -18,8 +28,9 @@ def get_elevation(lat: float, lon: float) -> float | None:
     Returns None if the request fails.
     """
     try:
-        api_url = f"https://api.open-meteo.com/v1/elevation?latitude={lat}&longitude={lon}"
-        response = requests.get(api_url)
+        api_url = f"{ELEVATION_URL}?latitude={lat}&longitude={lon}"
+        elevation_rate_limiter.wait()
+        response = requests.get(api_url, timeout=ELEVATION_TIMEOUT_SECONDS)
         response.raise_for_status()  # Raises error for bad responses
         elevation = response.json().get("elevation", [0.0])[0]  # Extract elevation
         return elevation
@@ -27,40 +38,103 @@ def get_elevation(lat: float, lon: float) -> float | None:
         print(f"Elevation API error: {e}")
         return None
 
+# Open-Meteo accepts up to 100 coordinates per elevation request
+ELEVATION_BATCH_SIZE = 100
+
+def get_elevations(lats: list[float], lons: list[float]) -> list[float | None]:
+    """
+    Bulk version of get_elevation: one Open-Meteo request per 100 coordinates.
+    Elevations of a failed batch are None.
+    """
+    elevations = []
+    for start in range(0, len(lats), ELEVATION_BATCH_SIZE):
+        batch_lats = lats[start:start + ELEVATION_BATCH_SIZE]
+        batch_lons = lons[start:start + ELEVATION_BATCH_SIZE]
+        try:
+            api_url = (
+                f"{ELEVATION_URL}?"
+                f"latitude={','.join(str(lat) for lat in batch_lats)}"
+                f"&longitude={','.join(str(lon) for lon in batch_lons)}"
+            )
+            elevation_rate_limiter.wait()
+            response = requests.get(api_url, timeout=ELEVATION_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            elevations.extend(response.json()["elevation"])
+        except Exception as e:
+            print(f"Elevation API error: {e}")
+            elevations.extend([None] * len(batch_lats))
+    return elevations
+
 # then, define function that takes in lat/long and outputs timezone (tz)
+_timezone_finder = None
+
 def get_timezone(lat: float, lon: float) -> TimezoneFinder:
-    tf = TimezoneFinder()
-    timezone_str = tf.timezone_at(lng=lon, lat=lat)
+    # Loading the timezone polygons is slow, so build the finder once and reuse it
+    global _timezone_finder
+    if _timezone_finder is None:
+        _timezone_finder = TimezoneFinder()
+    timezone_str = _timezone_finder.timezone_at(lng=lon, lat=lat)
     return timezone_str
 
-ZIP_df = pd.read_csv(DATA_DIR/"uszips.csv")
-geolocator = Nominatim(user_agent="solar_forecaster")
-
 # Finally, define main function
-def get_ZIP_data(ZIP):
+def get_ZIP_data(ZIP, offline_elevation: bool = False):
     """
-    Input is a ZIP code. Output is (latitude,longitude)
-    First tries the csv database, then tries geopy.
-    Returns None if neither work.
+    Input is a ZIP code. Output is (latitude, longitude, elevation, timezone, source),
+    where source says where the coordinates came from ("nearest" means approximate).
+    Latitude/longitude come from the offline geocoder, which only falls back to
+    Nominatim for ZIPs missing from every local table.
+    With offline_elevation, uncached ZIPs get pvlib's coarse offline elevation
+    instead of waiting on Open-Meteo (e.g. for the quick clear-sky estimate).
+    Returns None if the ZIP can't be located. Successful lookups are cached in location_cache.
     """
+    ZIP = normalize_zip(ZIP)
+    cached = location_cache.get(ZIP)
+    if cached is not None:
+        return cached
 
-    df_row = ZIP_df[ZIP_df["zip"].astype(str)==str(ZIP)]
-    if not df_row.empty:
-        lat = df_row.iloc[0]["lat"]
-        lon = df_row.iloc[0]["lng"]
-        elevation = get_elevation(lat, lon)
-        timezone = get_timezone(lat, lon)
-        return lat, lon, elevation, timezone
-
-    try:
-        location = geolocator.geocode(f"{ZIP},USA")
-        if location:
-            elevation = get_elevation(location.latitude, location.longitude)
-            timezone = get_timezone(location.latitude, location.longitude)
-            return location.latitude, location.longitude, elevation, timezone
-    except Exception as e:
-        print(f"Geopy error for ZIP {ZIP}: {e}")
+    coordinates = geocode_zip(ZIP)
+    if coordinates is None:
         return None
+    lat, lon, source = coordinates
+    if offline_elevation:
+        # Approximate, so not cached; the full model run fetches the real elevation
+        return lat, lon, float(lookup_altitude(lat, lon)), get_timezone(lat, lon), source
+    location_data = (lat, lon, get_elevation(lat, lon), get_timezone(lat, lon), source)
+
+    # Don't cache partial results (e.g. the elevation API was briefly down), nor
+    # nearest-ZIP guesses, which Nominatim may be able to improve on next time
+    if None not in location_data and source != "nearest":
+        location_cache.set(ZIP, location_data)
+    return location_data
+
+
+def get_ZIP_data_bulk(ZIPs) -> dict:
+    """
+    Bulk version of get_ZIP_data. Returns {normalized ZIP: location data or None}.
+    Uncached ZIPs are geocoded together and their elevations fetched in batches.
+    """
+    results, uncached = {}, []
+    for ZIP in dict.fromkeys(normalize_zip(ZIP) for ZIP in ZIPs):
+        cached = location_cache.get(ZIP)
+        if cached is not None:
+            results[ZIP] = cached
+        else:
+            uncached.append(ZIP)
+
+    coordinates = geocode_zips(uncached)
+    located = [ZIP for ZIP in uncached if coordinates[ZIP] is not None]
+    elevations = get_elevations([coordinates[ZIP][0] for ZIP in located],
+                                [coordinates[ZIP][1] for ZIP in located])
+
+    for ZIP in uncached:
+        results[ZIP] = None
+    for ZIP, elevation in zip(located, elevations):
+        lat, lon, source = coordinates[ZIP]
+        location_data = (lat, lon, elevation, get_timezone(lat, lon), source)
+        if elevation is not None and source != "nearest":
+            location_cache.set(ZIP, location_data)
+        results[ZIP] = location_data
+    return results
 
 
 #test
@@ -68,5 +142,5 @@ if __name__ == "__main__":
     #only runs if the script is run directly -- not if it's imported as a module
     test_ZIPs = ["83333","91106","49629"]
     for ZIP in test_ZIPs:
-        data = ZIP_data(ZIP)
-        print(f"{ZIP},{data[0]},{data[1]},{data[2]},{data[3]}")
\ No newline at end of file
+        data = get_ZIP_data(ZIP)
+        print(f"{ZIP},{data[0]},{data[1]},{data[2]},{data[3]},{data[4]}")
\ No newline at end of file
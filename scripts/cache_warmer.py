@@ -0,0 +1,169 @@
+"""
+Warms the location, weather and model-result caches for popular ZIPs.
+
+The ZIP list comes from WARM_ZIPS in config.py (optional) plus the most frequent
+ZIPs in the dashboard's request log. Warming runs in a background thread, goes
+through the same rate limiters as user requests, and leaves part of the hourly
+NREL quota for users.
+"""
+import csv
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+import config
+from config import DATA_DIR
+from SystemConfig import SystemConfig
+from nrel_data_avg import load_tmy_weather, nrel_rate_limiter, YEARS_TO_FETCH
+from run_pvlib import run_pvlib_model
+
+REQUEST_LOG = DATA_DIR / "request_log.csv"
+MAX_LOGGED_ZIPS = 300
+
+# The log only needs recent requests. Entries older than REQUEST_LOG_MAX_AGE_DAYS are
+# dropped at startup, and once it passes REQUEST_LOG_MAX_ROWS it is cut to the newest half.
+REQUEST_LOG_MAX_ROWS = 50_000
+REQUEST_LOG_MAX_AGE_DAYS = 90
+
+# Number of NREL requests per hour the warmer never uses, so users are not starved
+NREL_RESERVE_PER_HOUR = 200
+
+# Dashboard form defaults. Results for these are precomputed for every warmed ZIP.
+DEFAULT_CONFIGS = [
+    dict(system_capacity_kw=7.5, module_efficiency=0.20, system_losses=0.14,
+         tilt_deg=20, azimuth_deg=180, max_angle=60, tracking_type="fixed"),
+    dict(system_capacity_kw=7.5, module_efficiency=0.20, system_losses=0.14,
+         tilt_deg=20, azimuth_deg=180, max_angle=60, tracking_type="single-axis"),
+]
+
+_log_lock = threading.Lock()
+_log_rows = None  # rows in REQUEST_LOG, counted on first use
+
+
+def _trim_log(max_rows: int = REQUEST_LOG_MAX_ROWS) -> list[list[str]]:
+    """
+    Rewrites the request log with at most max_rows entries newer than
+    REQUEST_LOG_MAX_AGE_DAYS and returns them. Call with _log_lock held.
+    """
+    if not REQUEST_LOG.exists():
+        return []
+    # ISO timestamps in UTC sort as strings
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=REQUEST_LOG_MAX_AGE_DAYS)).isoformat()
+    with open(REQUEST_LOG, newline="") as f:
+        rows = [row for row in csv.reader(f) if len(row) > 1 and row[0] >= cutoff]
+    rows = rows[-max_rows:]
+
+    temp_path = REQUEST_LOG.with_name(f"{REQUEST_LOG.name}.tmp")
+    with open(temp_path, "w", newline="") as f:
+        csv.writer(f).writerows(rows)
+    os.replace(temp_path, REQUEST_LOG)
+    return rows
+
+
+def record_request(zip_code: str):
+    """Appends a ZIP to the request log that popular_zips_from_log() learns from."""
+    global _log_rows
+    with _log_lock:
+        REQUEST_LOG.parent.mkdir(parents=True, exist_ok=True)
+        if _log_rows is None:
+            _log_rows = len(_trim_log())
+        with open(REQUEST_LOG, "a", newline="") as f:
+            csv.writer(f).writerow([datetime.now(timezone.utc).isoformat(), str(zip_code)])
+        _log_rows += 1
+        if _log_rows > REQUEST_LOG_MAX_ROWS:
+            _log_rows = len(_trim_log(REQUEST_LOG_MAX_ROWS // 2))
+
+
+def popular_zips_from_log(limit: int = MAX_LOGGED_ZIPS) -> list[str]:
+    """Returns the most requested recent ZIPs in the request log, most popular first."""
+    global _log_rows
+    with _log_lock:
+        rows = _trim_log()
+        _log_rows = len(rows)
+    counts = Counter(row[1] for row in rows)
+    return [zip_code for zip_code, _ in counts.most_common(limit)]
+
+
+def get_warm_zips() -> list[str]:
+    """Configured ZIPs first, then learned ones, without duplicates."""
+    configured = [str(z) for z in getattr(config, "WARM_ZIPS", [])]
+    return list(dict.fromkeys(configured + popular_zips_from_log()))
+
+
+class CacheWarmer:
+    """
+    Prefetches location data, TMY weather and default-config results for a list of ZIPs.
+    Use start() to run in the background and progress() to check on it.
+    """
+    def __init__(self, zip_codes: list[str], default_configs: list[dict] = DEFAULT_CONFIGS):
+        self.zip_codes = list(zip_codes)
+        self.default_configs = default_configs
+        self.done = 0
+        self.failed = []
+        self.current = None
+        self.started_at = None
+        self.finished_at = None
+        self._thread = None
+
+    def start(self) -> "CacheWarmer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, name="cache-warmer", daemon=True)
+            self._thread.start()
+        return self
+
+    def _wait_for_nrel_quota(self):
+        # Each uncached ZIP costs one NREL request per year
+        while True:
+            remaining = nrel_rate_limiter.remaining()
+            if remaining is None or remaining - len(YEARS_TO_FETCH) >= NREL_RESERVE_PER_HOUR:
+                return
+            time.sleep(60)
+
+    def warm_zip(self, zip_code: str):
+        """Warms every cache for one ZIP. Raises if any step fails."""
+        self._wait_for_nrel_quota()
+        if load_tmy_weather(zip_code) is None:
+            raise RuntimeError("no TMY weather")
+        for params in self.default_configs:
+            # SystemConfig also warms the location cache
+            run_pvlib_model(SystemConfig(zip_code=zip_code, **params))
+
+    def run(self):
+        self.started_at = time.monotonic()
+        print(f"[cache warmer] Warming {len(self.zip_codes)} ZIPs...")
+        for zip_code in self.zip_codes:
+            self.current = zip_code
+            start = time.monotonic()
+            try:
+                self.warm_zip(zip_code)
+                status = "ok"
+            except Exception as e:
+                self.failed.append(zip_code)
+                status = f"failed ({e})"
+            self.done += 1
+            print(f"[cache warmer] {self.done}/{len(self.zip_codes)} ZIP {zip_code}: "
+                  f"{status} in {time.monotonic() - start:.1f} s")
+        self.current = None
+        self.finished_at = time.monotonic()
+        print(f"[cache warmer] Finished: {self.done - len(self.failed)} warmed, {len(self.failed)} failed.")
+
+    def progress(self) -> dict:
+        """Snapshot of the warmer's progress."""
+        end = self.finished_at or time.monotonic()
+        return {
+            "total": len(self.zip_codes),
+            "done": self.done,
+            "failed": list(self.failed),
+            "current": self.current,
+            "elapsed_s": round(end - self.started_at, 1) if self.started_at else 0.0,
+            "finished": self.finished_at is not None,
+        }
+
+
+# Test
+if __name__ == "__main__":
+    warmer = CacheWarmer(get_warm_zips() or ["83333"])
+    warmer.run()
+    print(warmer.progress())
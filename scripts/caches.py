@@ -0,0 +1,118 @@
+"""
+Defines a small thread-safe, named in-memory cache used across the project.
+
+Every cache created here is registered in CACHES by name so other modules
+(and the dashboard) can inspect or clear them in one place.
+
+A cache can also have a memory budget (max_bytes). Entries are then sized with
+sizeof() and least recently used entries are evicted to stay within the budget.
+Budgets can be overridden per cache name with CACHE_MEMORY_BUDGETS_MB in config.py.
+"""
+import sys
+import threading
+
+import numpy as np
+from cachetools import LRUCache, TTLCache
+
+import config
+
+# Registry of every NamedCache created in this process, keyed by name
+CACHES = {}
+
+
+def sizeof(value) -> int:
+    """
+    Approximate bytes held by a cached value. pandas objects are measured with
+    memory_usage(deep=True) (index included), numpy arrays by nbytes, and tuples,
+    lists and dicts by their items. Buffers shared between entries are counted
+    once per entry.
+    """
+    if hasattr(value, "memory_usage"):
+        return int(np.sum(value.memory_usage(index=True, deep=True)))
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(sizeof(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(sizeof(k) + sizeof(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+
+class NamedCache:
+    """
+    A thread-safe LRU cache with an optional time-to-live (in seconds) and an
+    optional memory budget in bytes. maxsize always limits the number of entries.
+    """
+    def __init__(self, name: str, maxsize: int = 128, ttl: float | None = None,
+                 max_bytes: int | None = None):
+        self.name = name
+        self.ttl = ttl
+        self.maxsize = maxsize
+        budgets_mb = getattr(config, "CACHE_MEMORY_BUDGETS_MB", {})
+        if name in budgets_mb:
+            max_bytes = int(budgets_mb[name] * 1024 ** 2)
+        self.max_bytes = max_bytes
+
+        # With a budget, cachetools tracks the size in bytes and evicts by it
+        size_limit, getsizeof = (maxsize, None) if max_bytes is None else (max_bytes, sizeof)
+        if ttl is None:
+            self._cache = LRUCache(maxsize=size_limit, getsizeof=getsizeof)
+        else:
+            self._cache = TTLCache(maxsize=size_limit, ttl=ttl, getsizeof=getsizeof)
+        self._lock = threading.Lock()
+        CACHES[name] = self
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._cache.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            try:
+                self._cache[key] = value
+            except ValueError:
+                # Larger than the whole budget, so it is not cached at all
+                return
+            if self.max_bytes is not None:
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem()
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._cache.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._cache
+
+    def __len__(self):
+        with self._lock:
+            return len(self._cache)
+
+    def nbytes(self) -> int:
+        """Approximate memory held by the cached values, in bytes."""
+        with self._lock:
+            if self.max_bytes is not None:
+                return int(self._cache.currsize)
+            return sum(sizeof(value) for value in self._cache.values())
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "max_entries": self.maxsize,
+            "bytes": self.nbytes(),
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+        }
+
+    def __repr__(self):
+        return f"NamedCache(name={self.name!r}, entries={len(self)}, ttl={self.ttl}, max_bytes={self.max_bytes})"
+
+
+def cache_memory_report() -> dict:
+    """{cache name: stats()} for every registered cache."""
+    return {name: cache.stats() for name, cache in CACHES.items()}
@@ -6,4 +6,23 @@ from pathlib import Path
 BASE_DIR = Path(__file__).resolve().parent
 DATA_DIR = BASE_DIR/"data"
 EMAIL = "your email"
-USER_NAME = "your name"
\ No newline at end of file
+USER_NAME = "your name"
+
+# Optional: ZIPs to prefetch into the caches when the dashboard starts
+WARM_ZIPS = ["83333"]
+
+# Optional: per-stage memory tracking (tracemalloc, slows the app down), shown at /memory
+TRACK_MEMORY = False
+
+# Optional: retention for downloaded weather in DATA_DIR (least recently used files go first)
+DATA_MAX_AGE_DAYS = 180
+DATA_MAX_SIZE_MB = 2048
+
+# Optional: memory budgets in MB that override the defaults of named caches
+CACHE_MEMORY_BUDGETS_MB = {"tmy_weather": 256, "model_results": 256}
+
+# Optional: Unix socket for model_worker.py / model_client.py (default: DATA_DIR / "model_worker.sock")
+# WORKER_SOCKET = "/tmp/solar_model_worker.sock"
+
+# Optional: OpenWeather One Call calls allowed per day (1,000 are included in the free tier)
+OPENWEATHER_MAX_PER_DAY = 1000
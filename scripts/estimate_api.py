@@ -0,0 +1,239 @@
+"""
+JSON API for production estimates, served by the dashboard's Flask server.
+
+    POST /estimate        one SystemConfig -> annual, monthly and optional hourly output
+    POST /estimate/batch  {"systems": [...]} -> one result per system, computed concurrently
+    POST /forecast        one SystemConfig -> 48-hour production forecast (OpenWeather)
+
+Request bodies use SystemConfig field names (see SystemConfig.from_dict). Optional
+"hourly" selects the hourly encoding:
+    omitted / false  no hourly data
+    "list"           AC power in whole watts as a JSON list
+    "float32"        base64 of little-endian float32 watts (about 4x smaller than "list")
+Batch entries may set their own "hourly". monthly_kwh is keyed by month ("01".."12").
+
+Responses carry an ETag derived from the config, the options and the weather the
+result was computed from, plus Cache-Control. A request with a matching
+If-None-Match gets 304 Not Modified without running the model.
+
+Forecasts are fetched in the background (see forecast_model.py). The first
+request for a location gets 202 with Retry-After; retry it to get the forecast.
+"""
+import base64
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from flask import Blueprint, jsonify, request
+
+from SystemConfig import SystemConfig
+from nrel_data_avg import weather_fingerprint
+from run_pvlib import run_pvlib_model, energy_kwh
+from forecast_model import run_forecast_model
+from openweather_data import FORECAST_TTL_SECONDS
+
+# TMY-based results only change when the weather does, and the ETag covers that
+CACHE_CONTROL = "public, max-age=86400"
+
+# Seconds a client should wait before asking again for a forecast that is still loading
+FORECAST_RETRY_AFTER = 5
+
+BATCH_WORKERS = 8
+MAX_BATCH_SIZE = 500
+HOURLY_ENCODINGS = {"list", "float32"}
+
+estimate_api = Blueprint("estimate_api", __name__)
+_batch_pool = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="estimate-batch")
+
+
+def register_estimate_api(server):
+    """Adds the /estimate routes to a Flask server (e.g. a Dash app's app.server)."""
+    server.register_blueprint(estimate_api)
+
+
+def parse_hourly_option(body: dict) -> str | None:
+    hourly = body.pop("hourly", None)
+    if hourly in (None, False):
+        return None
+    if hourly not in HOURLY_ENCODINGS:
+        raise ValueError(f"hourly must be one of {sorted(HOURLY_ENCODINGS)} or false")
+    return hourly
+
+
+def compute_etag(config: SystemConfig, hourly: str | None) -> str | None:
+    """Strong ETag for a config + options, or None if its weather is not on disk yet."""
+    fingerprint = weather_fingerprint(config.zip_code, interval=config.interval_minutes)
+    if fingerprint is None:
+        return None
+    key = json.dumps([config.to_dict(), hourly, fingerprint], sort_keys=True)
+    return '"' + hashlib.sha256(key.encode()).hexdigest()[:32] + '"'
+
+
+def encode_hourly(ac_power, encoding: str) -> dict:
+    values = ac_power.to_numpy()
+    if encoding == "float32":
+        encoded = base64.b64encode(values.astype("<f4").tobytes()).decode("ascii")
+    else:
+        encoded = np.rint(values).astype(int).tolist()
+    return {
+        "start": ac_power.index[0].isoformat(),
+        "interval_minutes": int((ac_power.index[1] - ac_power.index[0]).total_seconds() // 60),
+        "unit": "W",
+        "encoding": encoding,
+        "values": encoded,
+    }
+
+
+def estimate(config: SystemConfig, hourly: str | None) -> dict:
+    """Runs the model for one config and builds the JSON-ready result."""
+    ac_power = run_pvlib_model(config)
+    # The local-time index starts with a few hours of the previous December, so
+    # group by calendar month rather than returning the 13 month-end bins
+    monthly_kwh = energy_kwh(ac_power, "ME")
+    monthly_kwh = monthly_kwh.groupby(monthly_kwh.index.month).sum()
+    result = {
+        "config": config.to_dict(),
+        "location": {"latitude": config.latitude, "longitude": config.longitude,
+                     "source": config.location_source},
+        "annual_kwh": round(float(energy_kwh(ac_power)), 1),
+        "monthly_kwh": {f"{month:02d}": round(float(value), 1) for month, value in monthly_kwh.items()},
+    }
+    if hourly:
+        result["hourly"] = encode_hourly(ac_power, hourly)
+    return result
+
+
+def error_response(message: str, status: int):
+    return jsonify({"error": message}), status
+
+
+def cached_response(payload: dict, etag: str | None):
+    response = jsonify(payload)
+    if etag:
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = CACHE_CONTROL
+    else:
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def not_modified(etag: str):
+    return "", 304, {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+
+def if_none_match_hit(etag: str | None) -> bool:
+    # werkzeug stores the client's tags without their quotes
+    return etag is not None and request.if_none_match.contains(etag.strip('"'))
+
+
+@estimate_api.post("/estimate")
+def post_estimate():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return error_response("Request body must be a JSON object", 400)
+
+    try:
+        hourly = parse_hourly_option(body)
+        config = SystemConfig.from_dict(body)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    # Cheap check first: if the weather is on disk and the client has this result, skip the model
+    etag = compute_etag(config, hourly)
+    if if_none_match_hit(etag):
+        return not_modified(etag)
+
+    try:
+        payload = estimate(config, hourly)
+    except RuntimeError as e:
+        # Weather could not be fetched
+        return error_response(str(e), 503)
+
+    return cached_response(payload, compute_etag(config, hourly))
+
+
+def _build_config(item, hourly: str | None) -> tuple[SystemConfig, str | None] | str:
+    """
+    SystemConfig and hourly encoding for one batch entry, or an error message.
+    An entry's own "hourly" overrides the batch's.
+    """
+    if not isinstance(item, dict):
+        return "Each system must be a JSON object"
+    item = dict(item)
+    try:
+        if "hourly" in item:
+            hourly = parse_hourly_option(item)
+        return SystemConfig.from_dict(item), hourly
+    except ValueError as e:
+        return str(e)
+
+
+def _estimate_item(entry: tuple[SystemConfig, str | None] | str) -> dict:
+    """One batch entry. Errors are reported per item instead of failing the batch."""
+    if isinstance(entry, str):
+        return {"error": entry}
+    try:
+        return estimate(*entry)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def batch_etag(entries: list) -> str | None:
+    """ETag for a whole batch. Only set if every entry is valid and has weather on disk."""
+    item_etags = [
+        compute_etag(*entry) if isinstance(entry, tuple) else None
+        for entry in entries
+    ]
+    if not item_etags or None in item_etags:
+        return None
+    return '"' + hashlib.sha256("".join(item_etags).encode()).hexdigest()[:32] + '"'
+
+
+@estimate_api.post("/estimate/batch")
+def post_estimate_batch():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or not isinstance(body.get("systems"), list):
+        return error_response('Request body must be {"systems": [...]}', 400)
+    if len(body["systems"]) > MAX_BATCH_SIZE:
+        return error_response(f"At most {MAX_BATCH_SIZE} systems per batch", 400)
+
+    try:
+        hourly = parse_hourly_option(body)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    # Location lookups and weather downloads dominate, so both steps run on the pool
+    entries = list(_batch_pool.map(lambda item: _build_config(item, hourly), body["systems"]))
+    etag = batch_etag(entries)
+    if if_none_match_hit(etag):
+        return not_modified(etag)
+
+    results = list(_batch_pool.map(_estimate_item, entries))
+    return cached_response({"results": results}, batch_etag(entries))
+
+
+@estimate_api.post("/forecast")
+def post_forecast():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return error_response("Request body must be a JSON object", 400)
+
+    try:
+        hourly = parse_hourly_option(body) or "list"
+        config = SystemConfig.from_dict(body)
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    ac_power = run_forecast_model(config)
+    if ac_power is None:
+        # The background refresher has been asked to fetch this location
+        return jsonify({"status": "pending"}), 202, {"Retry-After": str(FORECAST_RETRY_AFTER)}
+
+    response = jsonify({
+        "config": config.to_dict(),
+        "forecast_kwh": round(float(energy_kwh(ac_power)), 1),
+        "hourly": encode_hourly(ac_power, hourly),
+    })
+    response.headers["Cache-Control"] = f"max-age={FORECAST_TTL_SECONDS}"
+    return response
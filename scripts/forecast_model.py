@@ -0,0 +1,196 @@
+"""
+Near-term (48-hour) production forecasts from the OpenWeather hourly forecast.
+
+OpenWeather only provides cloud cover, so irradiance is derived from a pvlib
+clear-sky model and a cloud-cover transposition (Larson et al., 2016):
+    GHI = GHI_clear * (offset + (1 - offset) * (1 - cloud_cover))
+DNI is then split out with the DISC model and DHI is the remainder.
+
+Forecasts are cached per location for FORECAST_TTL_SECONDS and refreshed by a
+background thread, so a user request only ever reads the cache. Each tracked
+location costs about 8 One Call requests per hour, so only recently requested
+locations are refreshed, and refreshes stop while the daily quota is nearly used
+up so new locations can still be fetched.
+"""
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pvlib
+
+from caches import NamedCache
+from openweather_data import fetch_openweather, openweather_rate_limiter, FORECAST_TTL_SECONDS
+from run_pvlib import get_location, run_model_on_weather
+
+# Fraction of clear-sky GHI that still reaches the ground under full overcast
+CLOUD_COVER_OFFSET = 0.35
+
+# Refresh a little before entries expire so tracked locations never go cold
+REFRESH_INTERVAL_SECONDS = FORECAST_TTL_SECONDS * 0.75
+
+# Stop refreshing a location nobody has asked about for this long
+TRACKING_IDLE_SECONDS = 60 * 60
+
+# Share of the daily OpenWeather quota kept for locations that aren't cached yet
+NEW_LOCATION_RESERVE = 0.2
+
+forecast_cache = NamedCache("openweather_forecast", maxsize=1024, ttl=FORECAST_TTL_SECONDS)
+
+
+def location_key(lat: float, lon: float) -> tuple:
+    """Rounds coordinates to ~1 km so nearby ZIPs share one forecast."""
+    return round(float(lat), 2), round(float(lon), 2)
+
+
+def cloud_cover_to_irradiance(cloud_cover: pd.Series, location: pvlib.location.Location) -> pd.DataFrame:
+    """
+    Derives GHI, DNI and DHI (W/m^2) from cloud cover (%) indexed by a tz-aware DatetimeIndex.
+    """
+    times = cloud_cover.index
+    clearsky = location.get_clearsky(times, model="ineichen")
+    solar_zenith = location.get_solarposition(times)["apparent_zenith"]
+
+    cloud_fraction = cloud_cover.clip(0, 100).fillna(0) / 100
+    ghi = clearsky["ghi"] * (CLOUD_COVER_OFFSET + (1 - CLOUD_COVER_OFFSET) * (1 - cloud_fraction))
+    dni = pvlib.irradiance.disc(ghi, solar_zenith, times)["dni"].fillna(0)
+    dhi = (ghi - dni * np.cos(np.radians(solar_zenith))).clip(lower=0)
+
+    return pd.DataFrame({"ghi": ghi, "dni": dni, "dhi": dhi}, index=times)
+
+
+def forecast_to_weather(forecast_df: pd.DataFrame, location: pvlib.location.Location) -> pd.DataFrame:
+    """
+    Converts a fetch_openweather DataFrame into a pvlib weather DataFrame.
+    """
+    forecast_df = forecast_df.set_index(
+        pd.DatetimeIndex(forecast_df["timestamp"]).tz_localize("UTC").tz_convert(location.tz)
+    )
+    weather = cloud_cover_to_irradiance(forecast_df["cloud_cover"].astype(float), location)
+    weather["temp_air"] = forecast_df["temperature"]
+    weather["wind_speed"] = forecast_df["wind_speed"].fillna(0)
+    return weather
+
+
+def refresh_forecast(lat: float, lon: float) -> pd.DataFrame | None:
+    """Fetches a fresh forecast for a location and stores it in the cache."""
+    key = location_key(lat, lon)
+    forecast_df = fetch_openweather(*key)
+    if forecast_df is not None:
+        forecast_cache.set(key, forecast_df)
+    return forecast_df
+
+
+class ForecastRefresher:
+    """
+    Background thread that keeps the forecast cache warm for every tracked location.
+    """
+    def __init__(self, interval: float = REFRESH_INTERVAL_SECONDS):
+        self.interval = interval
+        self._last_requested = {}  # location key --> time of last user request
+        self._last_attempt = {}    # location key --> time of last fetch (or skipped refresh)
+        self._fetched = set()      # locations fetched successfully at least once
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    def track(self, lat: float, lon: float):
+        """Marks a location as in use. New locations are fetched right away."""
+        key = location_key(lat, lon)
+        with self._lock:
+            is_new = key not in self._last_requested
+            self._last_requested[key] = time.monotonic()
+        if is_new:
+            self._wake.set()
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="forecast-refresher", daemon=True)
+            self._thread.start()
+
+    def _quota_low(self) -> bool:
+        """True once only the share of the daily quota kept for new locations is left."""
+        remaining = openweather_rate_limiter.remaining_today()
+        return remaining is not None and remaining <= openweather_rate_limiter.max_per_day * NEW_LOCATION_RESERVE
+
+    def _run(self):
+        while True:
+            # Cleared before the pass so a location tracked during it wakes the next one
+            self._wake.clear()
+            now = time.monotonic()
+            with self._lock:
+                # Forget locations that have not been requested in a while
+                for key, last in list(self._last_requested.items()):
+                    if now - last > TRACKING_IDLE_SECONDS:
+                        del self._last_requested[key]
+                        self._last_attempt.pop(key, None)
+                        self._fetched.discard(key)
+                keys = list(self._last_requested)
+
+            # New locations are due right away, others once their last fetch is an interval old.
+            # So a wake-up for a new location fetches only that one.
+            for key in keys:
+                last = self._last_attempt.get(key)
+                if last is not None and time.monotonic() - last < self.interval:
+                    continue
+                self._last_attempt[key] = time.monotonic()
+                if key in self._fetched and self._quota_low():
+                    # Keep the rest of the daily quota for locations users are waiting on
+                    continue
+                try:
+                    if refresh_forecast(*key) is not None:
+                        self._fetched.add(key)
+                except Exception as e:
+                    print(f"Forecast refresh failed for {key}: {e}")
+
+            # Sleep until the next location is due, or until a new one is tracked
+            with self._lock:
+                next_due = min(
+                    (self._last_attempt[key] + self.interval for key in self._last_requested if key in self._last_attempt),
+                    default=time.monotonic() + self.interval,
+                )
+            self._wake.wait(max(next_due - time.monotonic(), 1.0))
+
+
+refresher = ForecastRefresher()
+
+
+def get_forecast_weather(system_config) -> pd.DataFrame | None:
+    """
+    Returns the cached 48-hour pvlib weather for a system's location.
+    Returns None (and schedules a background fetch) if nothing is cached yet.
+    """
+    refresher.track(system_config.latitude, system_config.longitude)
+    refresher.start()
+
+    forecast_df = forecast_cache.get(location_key(system_config.latitude, system_config.longitude))
+    if forecast_df is None:
+        return None
+    return forecast_to_weather(forecast_df, get_location(system_config))
+
+
+def run_forecast_model(system_config) -> pd.Series | None:
+    """
+    Runs the same PV system as run_pvlib_model on the 48-hour forecast.
+    Returns hourly AC power (W), or None while the forecast is still loading.
+    """
+    weather = get_forecast_weather(system_config)
+    if weather is None:
+        return None
+    return run_model_on_weather(system_config, weather)
+
+
+# Test
+if __name__ == "__main__":
+    from SystemConfig import SystemConfig
+
+    system_config = SystemConfig(
+        zip_code="83333", system_capacity_kw=7.5, module_efficiency=0.20, system_losses=0.14,
+        tilt_deg=25, azimuth_deg=180, tracking_type="fixed", max_angle=90
+    )
+    ac_power = run_forecast_model(system_config)
+    while ac_power is None:
+        print("Waiting for the background forecast fetch...")
+        time.sleep(1)
+        ac_power = run_forecast_model(system_config)
+    print(ac_power.head(24))
+    print(f"Forecast 48-hour generation: {ac_power.sum() / 1000:,.1f} kWh")
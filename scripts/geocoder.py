@@ -0,0 +1,224 @@
+"""
+Offline ZIP geocoding backed by local centroid tables, with a rate-limited
+Nominatim queue for ZIPs that are not in any table.
+
+Tables are read from DATA_DIR. Only uszips.csv is required:
+  uszips.csv              simplemaps US ZIP table (zip, lat, lng)
+  zcta_centroids.txt      Census Gazetteer ZCTA file (GEOID, INTPTLAT, INTPTLONG), tab separated
+  zip_zcta_crosswalk.csv  ZIP --> ZCTA crosswalk (ZIP_CODE, ZCTA). Maps PO-box and
+                          single-business ZIPs, which have no area of their own, to
+                          the ZCTA that contains them.
+
+Lookup order: ZIP table, ZCTA centroids, crosswalk, then Nominatim. Only if
+Nominatim can't place the ZIP either (e.g. a retired ZIP) is the nearest known
+ZIP in the same 3-digit sectional center used. Every result carries its source
+("uszips", "zcta", "crosswalk", "nominatim" or "nearest") so callers can tell
+when a location is only approximate.
+"""
+import bisect
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from queue import Queue
+
+import pandas as pd
+from geopy.geocoders import Nominatim
+
+from config import DATA_DIR
+from caches import NamedCache
+from rate_limit import RateLimiter
+
+# Nominatim's usage policy allows at most 1 request per second
+nominatim_rate_limiter = RateLimiter("nominatim", min_interval=1.0)
+geolocator = Nominatim(user_agent="solar_forecaster")
+
+# ZIP --> (lat, lon) or None. Misses are cached too so a bad ZIP is only sent once.
+nominatim_cache = NamedCache("nominatim_geocode", maxsize=10000)
+
+# How long a caller waits for a queued Nominatim lookup, in seconds
+ONLINE_TIMEOUT = 30
+
+
+def normalize_zip(ZIP) -> str:
+    """'83333-1234', 83333 and ' 83333' --> '83333'. Restores dropped leading zeros."""
+    return str(ZIP).strip().split("-")[0].zfill(5)
+
+
+def is_valid_zip(ZIP: str) -> bool:
+    return len(ZIP) == 5 and ZIP.isdigit()
+
+
+def _read_centroids() -> dict:
+    """ZIP --> (lat, lon, source) from every local table that exists."""
+    centroids = {}
+
+    zcta_path = DATA_DIR / "zcta_centroids.txt"
+    if zcta_path.exists():
+        zcta_df = pd.read_csv(zcta_path, sep="\t", dtype={"GEOID": str})
+        zcta_df.columns = zcta_df.columns.str.strip()
+        for zcta, lat, lon in zip(zcta_df["GEOID"], zcta_df["INTPTLAT"], zcta_df["INTPTLONG"]):
+            centroids[normalize_zip(zcta)] = (float(lat), float(lon), "zcta")
+
+    # The ZIP table wins over ZCTA centroids where both have an entry
+    ZIP_df = pd.read_csv(DATA_DIR / "uszips.csv", usecols=["zip", "lat", "lng"], dtype={"zip": str})
+    for ZIP, lat, lon in zip(ZIP_df["zip"], ZIP_df["lat"], ZIP_df["lng"]):
+        centroids[normalize_zip(ZIP)] = (float(lat), float(lon), "uszips")
+
+    crosswalk_path = DATA_DIR / "zip_zcta_crosswalk.csv"
+    if crosswalk_path.exists():
+        crosswalk_df = pd.read_csv(crosswalk_path, dtype=str)
+        crosswalk_df.columns = crosswalk_df.columns.str.upper()
+        for ZIP, zcta in zip(crosswalk_df["ZIP_CODE"], crosswalk_df["ZCTA"]):
+            ZIP, zcta = normalize_zip(ZIP), normalize_zip(zcta)
+            if ZIP not in centroids and zcta in centroids:
+                lat, lon, _ = centroids[zcta]
+                centroids[ZIP] = (lat, lon, "crosswalk")
+
+    return centroids
+
+
+CENTROIDS = _read_centroids()
+_sorted_zips = sorted(CENTROIDS)
+
+
+def nearest_known_zip(ZIP: str) -> str | None:
+    """
+    Numerically closest known ZIP sharing the first three digits. ZIPs within a
+    sectional center are assigned roughly geographically, so this is a reasonable
+    stand-in for a retired ZIP.
+    """
+    position = bisect.bisect_left(_sorted_zips, ZIP)
+    candidates = [
+        _sorted_zips[i] for i in (position - 1, position)
+        if 0 <= i < len(_sorted_zips) and _sorted_zips[i][:3] == ZIP[:3]
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda candidate: abs(int(candidate) - int(ZIP)))
+
+
+def geocode_offline(ZIP) -> tuple[float, float, str] | None:
+    """Returns (lat, lon, source) from the local tables only, or None."""
+    return CENTROIDS.get(normalize_zip(ZIP))
+
+
+def geocode_nearest(ZIP) -> tuple[float, float, str] | None:
+    """Approximate (lat, lon, "nearest") from the numerically closest known ZIP, or None."""
+    ZIP = normalize_zip(ZIP)
+    if not is_valid_zip(ZIP):
+        return None
+    neighbor = nearest_known_zip(ZIP)
+    if neighbor is None:
+        return None
+    lat, lon, _ = CENTROIDS[neighbor]
+    return lat, lon, "nearest"
+
+
+class NominatimQueue:
+    """
+    Single background worker that sends queued ZIPs to Nominatim at most once per
+    second. Concurrent requests for the same ZIP share one lookup.
+    """
+    def __init__(self):
+        self._queue = Queue()
+        self._pending = {}  # ZIP --> Future
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, ZIP: str) -> Future:
+        with self._lock:
+            future = self._pending.get(ZIP)
+            if future is None:
+                future = Future()
+                self._pending[ZIP] = future
+                self._queue.put(ZIP)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="nominatim-queue", daemon=True)
+                self._thread.start()
+        return future
+
+    def _run(self):
+        while True:
+            ZIP = self._queue.get()
+            result = None
+            try:
+                nominatim_rate_limiter.wait()
+                location = geolocator.geocode(f"{ZIP},USA")
+                if location:
+                    result = (location.latitude, location.longitude)
+                nominatim_cache.set(ZIP, result)
+            except Exception as e:
+                # Network errors are not cached, so the ZIP is retried next time
+                print(f"Geopy error for ZIP {ZIP}: {e}")
+            with self._lock:
+                future = self._pending.pop(ZIP)
+            future.set_result(result)
+
+
+nominatim_queue = NominatimQueue()
+
+
+def geocode_online(ZIP, timeout: float = ONLINE_TIMEOUT) -> tuple[float, float] | None:
+    """Looks a ZIP up on Nominatim through the cached, rate-limited queue."""
+    ZIP = normalize_zip(ZIP)
+    if ZIP in nominatim_cache:
+        return nominatim_cache.get(ZIP)
+    try:
+        return nominatim_queue.submit(ZIP).result(timeout=timeout)
+    except FutureTimeoutError:
+        print(f"Timed out waiting for Nominatim lookup of ZIP {ZIP}")
+        return None
+
+
+def _online_or_nearest(ZIP: str, online: tuple[float, float] | None) -> tuple[float, float, str] | None:
+    if online is not None:
+        return online[0], online[1], "nominatim"
+    return geocode_nearest(ZIP)
+
+
+def geocode_zip(ZIP) -> tuple[float, float, str] | None:
+    """
+    (lat, lon, source) for one ZIP: local tables first, then Nominatim, and the
+    nearest known ZIP only if Nominatim can't place it either.
+    """
+    offline = geocode_offline(ZIP)
+    if offline is not None:
+        return offline
+    if not is_valid_zip(normalize_zip(ZIP)):
+        return None
+    return _online_or_nearest(normalize_zip(ZIP), geocode_online(ZIP))
+
+
+def geocode_zips(ZIPs) -> dict:
+    """
+    Bulk version of geocode_zip. Returns {normalized ZIP: (lat, lon, source) or None}.
+    Unknown ZIPs are queued for Nominatim together and awaited at the end.
+    """
+    results, futures = {}, {}
+    for ZIP in ZIPs:
+        ZIP = normalize_zip(ZIP)
+        if ZIP in results or ZIP in futures:
+            continue
+        offline = geocode_offline(ZIP)
+        if offline is not None:
+            results[ZIP] = offline
+        elif not is_valid_zip(ZIP):
+            results[ZIP] = None
+        elif ZIP in nominatim_cache:
+            results[ZIP] = _online_or_nearest(ZIP, nominatim_cache.get(ZIP))
+        else:
+            futures[ZIP] = nominatim_queue.submit(ZIP)
+
+    for ZIP, future in futures.items():
+        # Lookups run one per second, so allow for the whole queue ahead of this one
+        try:
+            online = future.result(timeout=ONLINE_TIMEOUT + len(futures))
+        except FutureTimeoutError:
+            online = None
+        results[ZIP] = _online_or_nearest(ZIP, online)
+    return results
+
+
+# Test
+if __name__ == "__main__":
+    print(f"Loaded {len(CENTROIDS)} ZIP centroids.")
+    print(geocode_zips(["83333", "91106", "49629", "00501"]))
@@ -0,0 +1,420 @@
+"""
+Load-testing harness for solar_dashboard2.
+
+Serves the dashboard in-process and points the NREL, Open-Meteo and OpenWeather
+clients at local fake servers with configurable latency and rate limits. Simulated
+users then replay dashboard sessions against Dash's /_dash-update-component endpoint:
+
+    update_preliminary_results (submit click) --> update_results --> update_daily_graph
+
+Request bodies are built from app.callback_map, so they follow the callbacks as
+they change. ZIPs are drawn with a long-tailed popularity (a few ZIPs get most of
+the traffic) and configs are mixed across tracking types, sizes and intervals.
+
+The dashboard itself does not call OpenWeather yet. Its fake is served so that
+forecast-based callbacks can be load tested the same way.
+
+Each scenario prints throughput, p50/p95/p99 latency and error rate per callback.
+Downloaded weather goes to a temporary directory, so DATA_DIR is never touched.
+
+Usage:
+    python load_test.py                 # every scenario in SCENARIOS
+    python load_test.py warm cold-nrel  # only the named scenarios
+"""
+import json
+import logging
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import requests
+from pvlib.location import Location
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+import cache_warmer
+import nrel_data_avg
+import openweather_data
+import run_pvlib
+import ZIP_data
+from caches import CACHES
+from geocoder import CENTROIDS
+from nrel_data_avg import NSRDB_COLUMNS
+
+# --- Scenarios ---
+# users:              concurrent simulated users, each running sessions back to back
+# sessions_per_user:  dashboard sessions (submit + final result + daily graph) per user
+# zip_pool:           number of distinct ZIPs users pick from
+# cold:               start with empty caches and no weather on disk
+# api_latency_s:      added latency of every fake API response
+# nrel_max_per_second / elevation_max_per_second: fake API rate limits (None = unlimited)
+SCENARIOS = [
+    dict(name="warm", users=10, sessions_per_user=10, zip_pool=20, cold=False,
+         api_latency_s=0.2, nrel_max_per_second=None, elevation_max_per_second=None),
+    dict(name="cold", users=10, sessions_per_user=3, zip_pool=20, cold=True,
+         api_latency_s=0.5, nrel_max_per_second=None, elevation_max_per_second=None),
+    dict(name="cold-nrel", users=10, sessions_per_user=3, zip_pool=20, cold=True,
+         api_latency_s=0.5, nrel_max_per_second=1, elevation_max_per_second=10),
+    dict(name="warm-heavy", users=40, sessions_per_user=5, zip_pool=50, cold=False,
+         api_latency_s=0.2, nrel_max_per_second=None, elevation_max_per_second=None),
+]
+
+# Config mix: (value, weight)
+TRACKING_MIX = [("fixed", 0.65), ("single-axis", 0.3), ("dual-axis", 0.05)]
+INTERVAL_MIX = [(60, 0.8), (30, 0.1), (15, 0.1)]
+CAPACITY_KW = [4.0, 5.0, 6.0, 7.5, 8.0, 10.0, 12.0]
+
+REQUEST_TIMEOUT = 300
+RANDOM_SEED = 42
+
+
+# --- Fake external APIs ---
+class FakeAPI:
+    """
+    Local stand-in for an external API. handler(args) returns (body, content type).
+    Every response is delayed by latency_s. Above max_per_second requests in the
+    last second, the server answers 429 with Retry-After, like the real APIs.
+    """
+    def __init__(self, name: str, handler, latency_s: float = 0.0, max_per_second: int | None = None):
+        self.name = name
+        self.handler = handler
+        self.latency_s = latency_s
+        self.max_per_second = max_per_second
+        self.served = 0
+        self.rejected = 0
+        self._recent = deque()  # monotonic times of requests in the last second
+        self._lock = threading.Lock()
+        self._server = make_server("127.0.0.1", 0, self._wsgi_app, threaded=True)
+        self.url = f"http://127.0.0.1:{self._server.port}"
+
+    def _over_limit(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > 1.0:
+                self._recent.popleft()
+            if self.max_per_second is not None and len(self._recent) >= self.max_per_second:
+                self.rejected += 1
+                return True
+            self._recent.append(now)
+            self.served += 1
+            return False
+
+    def _wsgi_app(self, environ, start_response):
+        request = Request(environ)
+        time.sleep(self.latency_s)
+        if self._over_limit():
+            response = Response("Too Many Requests", status=429, headers={"Retry-After": "1"})
+        else:
+            try:
+                body, content_type = self.handler(request.args)
+                response = Response(body, content_type=content_type)
+            except Exception as e:
+                response = Response(f"Bad request: {e}", status=400)
+        return response(environ, start_response)
+
+    def start(self) -> "FakeAPI":
+        threading.Thread(target=self._server.serve_forever, name=f"fake-{self.name}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+
+
+def fake_nsrdb_csv(args) -> tuple[str, str]:
+    """One year of NSRDB-style CSV: clear-sky irradiance with random cloudy days."""
+    lon, lat = (float(value) for value in args["wkt"][len("POINT("):-1].split())
+    year = int(args["names"])
+    interval = int(args.get("interval", 60))
+
+    times = pd.date_range(f"{year}-01-01", f"{year}-12-31 23:59", freq=f"{interval}min", tz="UTC")
+    if args.get("leap_day") == "false":
+        times = times[~((times.month == 2) & (times.day == 29))]
+    clearsky = Location(lat, lon).get_clearsky(times, model="simplified_solis")
+
+    rng = np.random.default_rng(abs(hash((round(lat, 2), round(lon, 2), year))) % 2**32)
+    cloudiness = rng.uniform(0.3, 1.0, size=366)[times.dayofyear - 1]
+    day_of_year = times.dayofyear.to_numpy()
+    values = {
+        "ghi": clearsky["ghi"].to_numpy() * cloudiness,
+        "dhi": clearsky["dhi"].to_numpy(),
+        "dni": clearsky["dni"].to_numpy() * cloudiness,
+        "air_temperature": 12 - 12 * np.cos(2 * np.pi * (day_of_year - 15) / 365),
+        "wind_speed": rng.uniform(0.5, 6.0, size=len(times)),
+        "surface_albedo": np.full(len(times), 0.2),
+        "dew_point": np.full(len(times), 2.0),
+        "relative_humidity": np.full(len(times), 45.0),
+        "surface_pressure": np.full(len(times), 850.0),
+    }
+
+    df = pd.DataFrame({"Year": times.year, "Month": times.month, "Day": times.day,
+                       "Hour": times.hour, "Minute": times.minute})
+    for attribute in args["attributes"].split(","):
+        df[NSRDB_COLUMNS[attribute][0]] = np.round(values[attribute], 1)
+    # NSRDB files start with two metadata rows
+    header = f"Source,Latitude,Longitude\nNSRDB,{lat},{lon}\n"
+    return header + df.to_csv(index=False), "text/csv"
+
+
+def fake_elevation(args) -> tuple[str, str]:
+    latitudes = args["latitude"].split(",")
+    return json.dumps({"elevation": [1000.0] * len(latitudes)}), "application/json"
+
+
+def fake_onecall(args) -> tuple[str, str]:
+    """48 hours of One Call-style hourly forecast."""
+    start = int(datetime.now(timezone.utc).timestamp()) // 3600 * 3600
+    hourly = [
+        {"dt": start + 3600 * hour, "temp": 15.0, "feels_like": 14.0, "humidity": 40, "clouds": (hour * 7) % 100,
+         "wind_speed": 3.0, "wind_gust": 5.0, "pressure": 1015, "dew_point": 2.0, "uvi": 3.0, "pop": 0.1}
+        for hour in range(48)
+    ]
+    return json.dumps({"lat": float(args["lat"]), "lon": float(args["lon"]), "hourly": hourly}), "application/json"
+
+
+def start_fake_apis(scenario: dict) -> dict:
+    latency_s = scenario["api_latency_s"]
+    return {
+        "nrel": FakeAPI("nrel", fake_nsrdb_csv, latency_s, scenario["nrel_max_per_second"]).start(),
+        "open-meteo": FakeAPI("open-meteo", fake_elevation, latency_s, scenario["elevation_max_per_second"]).start(),
+        "openweather": FakeAPI("openweather", fake_onecall, latency_s).start(),
+    }
+
+
+def point_clients_at(fake_apis: dict, data_dir: Path):
+    """Sends every external API call to the fakes and all downloaded data to data_dir."""
+    nrel_data_avg.BASE_URL = fake_apis["nrel"].url + "/api/nsrdb/aggregated.csv"
+    nrel_data_avg.SUBHOURLY_BASE_URL = fake_apis["nrel"].url + "/api/nsrdb/conus.csv"
+    ZIP_data.ELEVATION_URL = fake_apis["open-meteo"].url + "/v1/elevation"
+    openweather_data.OPENWEATHER_URL = fake_apis["openweather"].url + "/data/3.0/onecall"
+    run_pvlib.DATA_DIR = data_dir
+    cache_warmer.REQUEST_LOG = data_dir / "request_log.csv"
+
+
+def clear_caches(data_dir: Path):
+    for cache in CACHES.values():
+        cache.clear()
+    shutil.rmtree(data_dir, ignore_errors=True)
+    data_dir.mkdir(parents=True)
+
+
+# --- Dash callback requests ---
+def split_output_id(output: str) -> list[dict] | dict:
+    """'..a.children...b.figure..' --> [{'id': 'a', 'property': 'children'}, ...]"""
+    if output.startswith(".."):
+        return [split_output_id(part) for part in output[2:-2].split("...")]
+    component_id, prop = output.rsplit(".", 1)
+    return {"id": component_id, "property": prop}
+
+
+def find_callback(app, callback_name: str) -> tuple[str, dict]:
+    for output, spec in app.callback_map.items():
+        if spec["callback"].__name__ == callback_name:
+            return output, spec
+    raise ValueError(f"No Dash callback named {callback_name}")
+
+
+def callback_payload(app, callback_name: str, values: dict) -> dict:
+    """
+    Body of a /_dash-update-component request for a callback, like the one the
+    browser sends. values maps 'component-id.property' to the current value.
+    """
+    output, spec = find_callback(app, callback_name)
+
+    def with_values(items):
+        return [{**item, "value": values.get(f"{item['id']}.{item['property']}")} for item in items]
+
+    return {
+        "output": output,
+        "outputs": split_output_id(output),
+        "inputs": with_values(spec["inputs"]),
+        "state": with_values(spec.get("state", [])),
+        "changedPropIds": [f"{item['id']}.{item['property']}" for item in spec["inputs"]],
+    }
+
+
+def response_value(body: dict, component_id: str, prop: str):
+    """Value of one output in a Dash callback response (outputs may carry an @hash suffix)."""
+    for key, value in body.get("response", {}).get(component_id, {}).items():
+        if key.split("@")[0] == prop:
+            return value
+    return None
+
+
+# --- Simulated users ---
+def weighted_choice(rng: random.Random, mix: list[tuple]):
+    values, weights = zip(*mix)
+    return rng.choices(values, weights=weights)[0]
+
+
+def pick_zip_pool(size: int, rng: random.Random) -> list[str]:
+    return rng.sample(sorted(CENTROIDS), size)
+
+
+def random_form_values(rng: random.Random, zip_pool: list[str], n_clicks: int) -> dict:
+    """Form state for one submit. ZIP popularity falls off as 1/rank."""
+    zip_code = rng.choices(zip_pool, weights=[1 / rank for rank in range(1, len(zip_pool) + 1)])[0]
+    return {
+        "submit-button.n_clicks": n_clicks,
+        "zip-input.value": zip_code,
+        "capacity-input.value": rng.choice(CAPACITY_KW),
+        "tracking-input.value": weighted_choice(rng, TRACKING_MIX),
+        "tilt-input.value": rng.randint(10, 40),
+        "azimuth-input.value": rng.choice([135, 160, 180, 180, 180, 200, 225]),
+        "axis-tilt-input.value": rng.randint(0, 30),
+        "max-angle-input.value": 60,
+        "losses-input.value": 14,
+        "interval-input.value": weighted_choice(rng, INTERVAL_MIX),
+    }
+
+
+class Stats:
+    """Thread-safe latency and error record per callback."""
+    def __init__(self):
+        self.latencies_ms = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, callback_name: str, latency_ms: float, ok: bool):
+        with self._lock:
+            self.latencies_ms.setdefault(callback_name, []).append(latency_ms)
+            self.errors[callback_name] = self.errors.get(callback_name, 0) + (not ok)
+
+    def report(self, elapsed_s: float) -> pd.DataFrame:
+        rows = []
+        for callback_name, latencies in self.latencies_ms.items():
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            rows.append({
+                "callback": callback_name,
+                "requests": len(latencies),
+                "req/s": round(len(latencies) / elapsed_s, 2),
+                "p50 ms": round(p50), "p95 ms": round(p95), "p99 ms": round(p99),
+                "error rate": round(self.errors[callback_name] / len(latencies), 3),
+            })
+        return pd.DataFrame(rows).set_index("callback")
+
+
+def post_callback(session: requests.Session, base_url: str, app, callback_name: str,
+                  values: dict, stats: Stats) -> dict | None:
+    """Sends one callback request and records its latency. Returns the response body, or None on error."""
+    payload = callback_payload(app, callback_name, values)
+    start = time.perf_counter()
+    try:
+        response = session.post(f"{base_url}/_dash-update-component", json=payload, timeout=REQUEST_TIMEOUT)
+        body = response.json() if response.status_code == 200 else None
+    except (requests.RequestException, ValueError):
+        body = None
+    latency_ms = (time.perf_counter() - start) * 1000
+
+    # Callbacks catch their own exceptions and report them in error-output
+    ok = body is not None and not response_value(body, "error-output", "children")
+    stats.record(callback_name, latency_ms, ok)
+    return body
+
+
+def run_user(base_url: str, app, zip_pool: list[str], sessions: int, seed: int, stats: Stats):
+    rng = random.Random(seed)
+    with requests.Session() as session:
+        for n_clicks in range(1, sessions + 1):
+            values = random_form_values(rng, zip_pool, n_clicks)
+            body = post_callback(session, base_url, app, "update_preliminary_results", values, stats)
+            if body is None:
+                continue
+            values["inputs-store.data"] = response_value(body, "inputs-store", "data")
+
+            body = post_callback(session, base_url, app, "update_results", values, stats)
+            if body is None:
+                continue
+            values["results-store.data"] = response_value(body, "results-store", "data")
+            values["day-picker.date"] = f"{nrel_data_avg.REPRESENTATIVE_YEAR}-{rng.randint(1, 12):02d}-15"
+            post_callback(session, base_url, app, "update_daily_graph", values, stats)
+
+
+# --- Scenario runner ---
+def warm_up(zip_pool: list[str], data_dir: Path):
+    """Untimed pass that caches every ZIP's location and weather at every interval in the mix."""
+    print(f"Warming {len(zip_pool)} ZIPs...")
+    for zip_code in zip_pool:
+        ZIP_data.get_ZIP_data(zip_code)
+        for interval, _ in INTERVAL_MIX:
+            nrel_data_avg.load_tmy_weather(zip_code, output_dir=data_dir, interval=interval)
+
+
+def run_scenario(scenario: dict, app, data_dir: Path) -> pd.DataFrame:
+    rng = random.Random(RANDOM_SEED)
+    zip_pool = pick_zip_pool(scenario["zip_pool"], rng)
+    fake_apis = start_fake_apis(scenario)
+    point_clients_at(fake_apis, data_dir)
+    dashboard = make_server("127.0.0.1", 0, app.server, threaded=True)
+    threading.Thread(target=dashboard.serve_forever, name="dashboard", daemon=True).start()
+    base_url = f"http://127.0.0.1:{dashboard.port}"
+
+    try:
+        if scenario["cold"]:
+            clear_caches(data_dir)
+        else:
+            warm_up(zip_pool, data_dir)
+
+        stats = Stats()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=scenario["users"]) as pool:
+            futures = [
+                pool.submit(run_user, base_url, app, zip_pool, scenario["sessions_per_user"],
+                            RANDOM_SEED + user + 1, stats)
+                for user in range(scenario["users"])
+            ]
+        elapsed_s = time.perf_counter() - start
+        # A user that crashed would otherwise just be missing from the report
+        failed_users = {}
+        for user, future in enumerate(futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed_users[user] = f"{type(e).__name__}: {e}"
+    finally:
+        dashboard.shutdown()
+        for fake_api in fake_apis.values():
+            fake_api.stop()
+
+    report = stats.report(elapsed_s)
+    sessions = scenario["users"] * scenario["sessions_per_user"]
+    print(f"\n=== {scenario['name']}: {scenario['users']} users, {sessions} sessions in {elapsed_s:.1f} s "
+          f"({sessions / elapsed_s:.2f} sessions/s) ===")
+    print(report.to_string())
+    if failed_users:
+        print(f"!!! {len(failed_users)} of {scenario['users']} users crashed; their remaining sessions are missing:")
+        for user, error in failed_users.items():
+            print(f"    user {user}: {error}")
+    report.attrs["failed_users"] = failed_users
+    print("Fake APIs: " + ", ".join(
+        f"{name} {api.served} served / {api.rejected} rate-limited" for name, api in fake_apis.items()
+    ))
+    return report
+
+
+def run_scenarios(scenarios: list[dict] = SCENARIOS) -> dict:
+    # The dashboard and fake servers would log every request
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    from solar_dashboard2 import app
+
+    data_dir = Path(tempfile.mkdtemp(prefix="solar_load_test_"))
+    try:
+        return {scenario["name"]: run_scenario(scenario, app, data_dir) for scenario in scenarios}
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    names = sys.argv[1:]
+    selected = [scenario for scenario in SCENARIOS if not names or scenario["name"] in names]
+    if not selected:
+        sys.exit(f"Unknown scenario(s) {names}. Choose from {[scenario['name'] for scenario in SCENARIOS]}")
+    run_scenarios(selected)
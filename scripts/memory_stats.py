@@ -0,0 +1,107 @@
+"""
+Memory accounting: peak traced memory per processing stage, plus cache sizes.
+
+Wrap a stage in `with memory_stage("name"):` to record how much memory it
+allocated at its peak, measured from the start of the stage. Stages can nest.
+Tracking uses tracemalloc and is off (and free) until start_tracking() is called,
+e.g. with TRACK_MEMORY = True in config.py. tracemalloc slows allocation-heavy
+code noticeably, so leave it off in production.
+
+Peaks are exact for single-threaded runs. With concurrent requests, a stage's
+peak also includes whatever other threads allocated at the same time.
+"""
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+from caches import cache_memory_report
+
+# Stage name --> {"calls", "last_peak_bytes", "max_peak_bytes", "total_peak_bytes"}
+STAGE_STATS = {}
+_stats_lock = threading.Lock()
+_local = threading.local()  # per-thread stack of open stages
+
+
+def start_tracking(frames: int = 1):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracking():
+    tracemalloc.stop()
+
+
+def _record(name: str, peak_bytes: int):
+    with _stats_lock:
+        stats = STAGE_STATS.setdefault(
+            name, {"calls": 0, "last_peak_bytes": 0, "max_peak_bytes": 0, "total_peak_bytes": 0}
+        )
+        stats["calls"] += 1
+        stats["last_peak_bytes"] = peak_bytes
+        stats["max_peak_bytes"] = max(stats["max_peak_bytes"], peak_bytes)
+        stats["total_peak_bytes"] += peak_bytes
+
+
+@contextmanager
+def memory_stage(name: str):
+    """Records the peak memory allocated while the block runs under STAGE_STATS[name]."""
+    if not tracemalloc.is_tracing():
+        yield
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+
+    current, peak = tracemalloc.get_traced_memory()
+    # reset_peak() is global, so save the enclosing stage's peak so far first
+    if stack:
+        stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+    tracemalloc.reset_peak()
+    frame = {"start": current, "peak": current}
+    stack.append(frame)
+    try:
+        yield
+    finally:
+        stack.pop()
+        peak = max(tracemalloc.get_traced_memory()[1], frame["peak"])
+        if stack:
+            stack[-1]["peak"] = max(stack[-1]["peak"], peak)
+        _record(name, max(peak - frame["start"], 0))
+
+
+def stage_report() -> dict:
+    """Per-stage peaks in MB."""
+    with _stats_lock:
+        return {
+            name: {
+                "calls": stats["calls"],
+                "last_peak_mb": round(stats["last_peak_bytes"] / 1024 ** 2, 2),
+                "max_peak_mb": round(stats["max_peak_bytes"] / 1024 ** 2, 2),
+                "mean_peak_mb": round(stats["total_peak_bytes"] / stats["calls"] / 1024 ** 2, 2),
+            }
+            for name, stats in STAGE_STATS.items()
+        }
+
+
+def memory_report() -> dict:
+    """Everything the dashboard's /memory endpoint shows."""
+    report = {"tracing": tracemalloc.is_tracing(), "stages": stage_report(), "caches": cache_memory_report()}
+    if report["tracing"]:
+        current, _ = tracemalloc.get_traced_memory()
+        report["traced_current_mb"] = round(current / 1024 ** 2, 2)
+    return report
+
+
+# Test
+if __name__ == "__main__":
+    import json
+    from SystemConfig import SystemConfig
+    from run_pvlib import run_pvlib_model
+
+    start_tracking()
+    config = SystemConfig(zip_code="83333", system_capacity_kw=7.5, module_efficiency=0.20,
+                          system_losses=0.14, tilt_deg=20, azimuth_deg=180, tracking_type="fixed", max_angle=60)
+    with memory_stage("total"):
+        run_pvlib_model(config)
+    print(json.dumps(memory_report(), indent=2))
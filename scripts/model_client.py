@@ -0,0 +1,109 @@
+"""
+Thin client for the model worker daemon (model_worker.py).
+
+Only uses the standard library, so it starts in milliseconds and leaves pandas,
+pvlib and the caches to the long-running worker. Results are printed as one JSON
+line per system as soon as the worker finishes it (not in input order; each line
+has "index" and "id").
+
+Examples:
+    python model_client.py --zip 83333 --capacity 7.5
+    python model_client.py --zip 83333 --capacity 7.5 --tracking single-axis --hourly float32
+    python model_client.py --batch systems.csv        # SystemConfig fields as columns (+ optional id)
+    python model_client.py --batch jobs.jsonl         # one SystemConfig JSON object per line
+    python model_client.py --stats
+
+Protocol (newline-delimited JSON over a Unix socket): the client sends one request
+line, {"jobs": [...], "hourly": ...} or {"command": "ping" | "stats"}, and the
+worker answers with one line per job followed by {"done": true, ...}.
+"""
+import argparse
+import csv
+import json
+import socket
+import sys
+from pathlib import Path
+
+import config
+from config import DATA_DIR
+
+
+def socket_path() -> Path:
+    """Where the worker listens. Set WORKER_SOCKET in config.py to change it."""
+    return Path(getattr(config, "WORKER_SOCKET", DATA_DIR / "model_worker.sock"))
+
+
+def send_request(request: dict, path: Path | None = None):
+    """Sends one request to the worker and yields each response line as a dict."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(path or socket_path()))
+        sock.sendall(json.dumps(request).encode() + b"\n")
+        with sock.makefile("r", encoding="utf-8") as lines:
+            for line in lines:
+                yield json.loads(line)
+
+
+def read_jobs(batch_path: Path) -> list[dict]:
+    """Jobs from a .csv (one system per row) or .jsonl (one JSON object per line) file."""
+    if batch_path.suffix == ".csv":
+        with open(batch_path, newline="") as f:
+            # Empty cells fall back to SystemConfig's defaults
+            return [{key: value for key, value in row.items() if value not in ("", None)} for row in csv.DictReader(f)]
+    with open(batch_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Submit SystemConfig jobs to the model worker daemon.")
+    parser.add_argument("--batch", type=Path, help=".csv or .jsonl file of systems")
+    parser.add_argument("--zip", dest="zip_code", help="ZIP code for a single system")
+    parser.add_argument("--capacity", dest="system_capacity_kw", type=float, help="System capacity (kW)")
+    parser.add_argument("--tracking", dest="tracking_type", choices=["fixed", "single-axis", "dual-axis"])
+    parser.add_argument("--tilt", dest="tilt_deg", type=float)
+    parser.add_argument("--azimuth", dest="azimuth_deg", type=float)
+    parser.add_argument("--max-angle", dest="max_angle", type=float)
+    parser.add_argument("--losses", dest="system_losses", type=float, help="Fraction, e.g. 0.14")
+    parser.add_argument("--interval", dest="interval_minutes", type=int, choices=[5, 15, 30, 60])
+    parser.add_argument("--hourly", choices=["list", "float32"], help="Also return the AC power series")
+    parser.add_argument("--stats", action="store_true", help="Show worker uptime and cache sizes")
+    parser.add_argument("--socket", type=Path, help="Worker socket (default: from config.py)")
+    args = parser.parse_args(argv)
+
+    if args.stats:
+        request = {"command": "stats"}
+    elif args.batch:
+        request = {"jobs": read_jobs(args.batch), "hourly": args.hourly}
+    elif args.zip_code and args.system_capacity_kw:
+        job_fields = ["zip_code", "system_capacity_kw", "tracking_type", "tilt_deg", "azimuth_deg",
+                      "max_angle", "system_losses", "interval_minutes"]
+        job = {field: getattr(args, field) for field in job_fields if getattr(args, field) is not None}
+        request = {"jobs": [job], "hourly": args.hourly}
+    else:
+        parser.error("give --zip and --capacity, --batch or --stats")
+
+    failed = 0
+    done = False
+    try:
+        for response in send_request(request, args.socket):
+            if response.get("done"):
+                done = True
+                print(f"{response['count']} jobs, {response['failed']} failed, "
+                      f"{response['elapsed_s']} s", file=sys.stderr)
+            else:
+                failed += "error" in response
+                print(json.dumps(response), flush=True)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f"No model worker listening on {args.socket or socket_path()}. "
+              "Start it with: python model_worker.py", file=sys.stderr)
+        return 2
+    except (ConnectionResetError, ValueError) as e:
+        print(f"Connection to the model worker failed: {e}", file=sys.stderr)
+    if not done:
+        # The worker stopped or crashed before finishing; the output is incomplete
+        print("The model worker did not finish the request; results are incomplete.", file=sys.stderr)
+        return 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,166 @@
+"""
+Long-lived model worker for scripts and cron jobs.
+
+Running `python run_pvlib.py` once per site pays for interpreter startup, the
+pandas/pvlib/timezonefinder imports and the ZIP table on every call, and throws
+the weather and result caches away afterwards. This daemon loads all of that
+once and serves jobs over a Unix socket; model_client.py is the matching CLI.
+
+Each request is one line of JSON (see model_client.py). Jobs in a request run
+concurrently, and each result is written back as soon as it is ready, one JSON
+line per job, followed by a final {"done": true, ...} line.
+
+Usage:
+    python model_worker.py          # listens on model_client.socket_path()
+    python model_worker.py --warm   # also prefetches WARM_ZIPS and popular ZIPs
+"""
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from SystemConfig import SystemConfig
+from ZIP_data import get_timezone
+from caches import cache_memory_report
+from cache_warmer import CacheWarmer, get_warm_zips
+from estimate_api import estimate, parse_hourly_option, MAX_BATCH_SIZE
+from model_client import socket_path
+
+JOB_WORKERS = 8
+
+_job_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="model-job")
+_started_at = time.monotonic()
+_jobs_served = 0
+_jobs_lock = threading.Lock()
+
+
+def run_job(job) -> dict:
+    """One SystemConfig job. Errors are returned, never raised, so a batch always finishes."""
+    if not isinstance(job, dict):
+        return {"error": "Each job must be a JSON object"}
+    job = dict(job)
+    job.pop("id", None)
+    try:
+        hourly = parse_hourly_option(job)
+        return estimate(SystemConfig.from_dict(job), hourly)
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def worker_stats() -> dict:
+    return {
+        "pid": os.getpid(),
+        "uptime_s": round(time.monotonic() - _started_at, 1),
+        "jobs_served": _jobs_served,
+        "caches": cache_memory_report(),
+    }
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def send(self, message: dict):
+        self.wfile.write(json.dumps(message).encode() + b"\n")
+        self.wfile.flush()
+
+    def handle(self):
+        global _jobs_served
+        start = time.monotonic()
+        line = self.rfile.readline()
+        if not line.strip():
+            # e.g. another worker checking whether this one is alive
+            return
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            self.send({"error": f"Invalid request: {e}"})
+            return
+        if not isinstance(request, dict):
+            self.send({"error": "Request must be a JSON object"})
+            return
+
+        if request.get("command") in ("ping", "stats"):
+            self.send({"pong": True} if request["command"] == "ping" else {"stats": worker_stats()})
+            self.send({"done": True, "count": 0, "failed": 0, "elapsed_s": 0.0})
+            return
+
+        jobs = request.get("jobs")
+        if not isinstance(jobs, list) or len(jobs) > MAX_BATCH_SIZE:
+            self.send({"error": f'Request must be {{"jobs": [...]}} with at most {MAX_BATCH_SIZE} jobs'})
+            return
+        hourly = request.get("hourly")
+
+        futures = {}
+        for index, job in enumerate(jobs):
+            if isinstance(job, dict) and hourly and "hourly" not in job:
+                job = {**job, "hourly": hourly}
+            futures[_job_pool.submit(run_job, job)] = index
+
+        failed = 0
+        try:
+            # Stream each result as soon as it is ready
+            for future in as_completed(futures):
+                index = futures[future]
+                job = jobs[index]
+                result = {"index": index, "id": job.get("id") if isinstance(job, dict) else None, **future.result()}
+                failed += "error" in result
+                self.send(result)
+            self.send({"done": True, "count": len(jobs), "failed": failed,
+                       "elapsed_s": round(time.monotonic() - start, 2)})
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away; the remaining jobs still finish and warm the caches
+            pass
+        with _jobs_lock:
+            _jobs_served += len(jobs)
+
+
+class WorkerServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def remove_stale_socket(path):
+    """Deletes a socket file left by a worker that died. Refuses if a worker is still running."""
+    if not path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            path.unlink(missing_ok=True)
+            return
+    sys.exit(f"A model worker is already listening on {path}")
+
+
+def serve(warm: bool = False):
+    path = socket_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    remove_stale_socket(path)
+
+    # Build the timezone finder now instead of on the first job
+    get_timezone(43.5, -114.3)
+    if warm:
+        CacheWarmer(get_warm_zips()).start()
+
+    server = WorkerServer(str(path), JobHandler)
+    os.chmod(path, 0o600)  # only this user may submit jobs
+
+    def stop(signum, frame):
+        # shutdown() waits for serve_forever(), so it must run on another thread
+        threading.Thread(target=server.shutdown).start()
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    print(f"Model worker {os.getpid()} listening on {path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        path.unlink(missing_ok=True)
+        print("Model worker stopped.")
+
+
+if __name__ == "__main__":
+    serve(warm="--warm" in sys.argv[1:])
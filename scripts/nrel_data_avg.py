@@ -7,111 +7,343 @@ API docs here: https://developer.nrel.gov/docs/solar/nsrdb/nsrdb-GOES-full-disc-
 More here: https://microsoft.github.io/AIforEarthDataSets/data/nsrdb.html
 """
 
+import hashlib
+import json
+import threading
+from io import StringIO
 import requests
+import numpy as np
 import pandas as pd
+from datetime import datetime, timezone
 from pathlib import Path
-import time
 from config import NREL_API_KEY, USER_NAME, EMAIL, DATA_DIR
 from ZIP_data import get_ZIP_data
+from caches import NamedCache
+from rate_limit import RateLimiter, retry_after_seconds
+from memory_stats import memory_stage
+from storage import get_store, DataStore
 
 # --- Configuration ---
 BASE_URL = "https://developer.nrel.gov/api/nsrdb/v2/solar/nsrdb-GOES-aggregated-v4-0-0-download.csv"
+# The aggregated dataset only goes down to 30 minutes; 5/15-minute data comes from the CONUS dataset
+SUBHOURLY_BASE_URL = "https://developer.nrel.gov/api/nsrdb/v2/solar/nsrdb-GOES-conus-v4-0-0-download.csv"
 REASON = "Educational / portfolio project"
 PVLIB_ATTRIBUTES = "ghi,dhi,dni,air_temperature,wind_speed"
 YEARS_TO_FETCH = [2023, 2024]
 REPRESENTATIVE_YEAR = 2023
 
-def fetch_and_average_nrel_data(zip_code: str, output_dir: Path) -> Path | None:
+# Data interval in minutes. Sub-hourly data is 2-12x larger, so it is averaged
+# and modeled one month at a time.
+INTERVAL_MINUTES = 60
+VALID_INTERVALS = (5, 15, 30, 60)
+
+# NREL developer APIs allow 1,000 requests per hour. Keep at least 1 s between downloads.
+nrel_rate_limiter = RateLimiter("nrel", min_interval=1.0, max_per_hour=1000)
+
+# ZIP --> TMY weather DataFrame loaded from disk. An hourly TMY is about 0.25 MB,
+# a 5-minute one about 3 MB.
+tmy_weather_cache = NamedCache("tmy_weather", maxsize=256, max_bytes=256 * 1024 ** 2)
+
+# One lock per ZIP so concurrent requests for the same ZIP download it only once
+_zip_locks = {}
+_zip_locks_lock = threading.Lock()
+
+# NSRDB attribute --> (column in the NSRDB CSV, column name pvlib expects)
+NSRDB_COLUMNS = {
+    "ghi": ("GHI", "ghi"),
+    "dhi": ("DHI", "dhi"),
+    "dni": ("DNI", "dni"),
+    "air_temperature": ("Temperature", "temp_air"),
+    "wind_speed": ("Wind Speed", "wind_speed"),
+    "surface_albedo": ("Surface Albedo", "albedo"),
+    "dew_point": ("Dew Point", "temp_dew"),
+    "relative_humidity": ("Relative Humidity", "relative_humidity"),
+    "surface_pressure": ("Pressure", "pressure"),
+}
+
+# Don't ask NREL again for a year that failed (e.g. not published yet) for this long
+RETRY_FAILED_YEAR_HOURS = 24
+
+
+def interval_suffix(interval: int) -> str:
+    """File name suffix for an interval. Hourly files keep their original names."""
+    return "" if interval == 60 else f"_{interval}min"
+
+
+def tmy_path(output_dir: Path, zip_code: str, interval: int = INTERVAL_MINUTES) -> Path:
+    """TMY file in the managed store (see storage.py). Older versions wrote .csv."""
+    return output_dir / f"nrel_tmy_{zip_code}{interval_suffix(interval)}.parquet"
+
+
+def raw_year_path(output_dir: Path, zip_code: str, year: int, interval: int = INTERVAL_MINUTES) -> Path:
+    """Per-year NSRDB data (pvlib column names, UTC index) is kept here."""
+    return output_dir / "nrel_raw" / f"nrel_{zip_code}_{year}{interval_suffix(interval)}.parquet"
+
+
+def raw_index_path(output_dir: Path, zip_code: str, interval: int = INTERVAL_MINUTES) -> Path:
     """
-    Fetches and averages hourly NREL data for multiple years to create a TMY file.
+    JSON index for a ZIP recording which attributes each cached year holds,
+    which years recently failed, and what the current TMY file was built from.
     """
-    location_data = get_ZIP_data(zip_code)
-    if not location_data:
-        print(f"Could not get location data for ZIP {zip_code}")
-        return None
-    lat, lon, elevation, timezone = location_data
+    return output_dir / "nrel_raw" / f"nrel_{zip_code}{interval_suffix(interval)}_index.json"
 
-    all_years_dfs = []
 
-    # Loop through each year and fetch its data
-    for year in YEARS_TO_FETCH:
-        params = {
-            "api_key": NREL_API_KEY, "wkt": f"POINT({lon:.4f} {lat:.4f})", "names": str(year),
-            "leap_day": "false", "interval": "60", "utc": "true", "full_name": USER_NAME,
-            "email": EMAIL, "affiliation": "Portfolio Project", "reason": REASON,
-            "attributes": PVLIB_ATTRIBUTES,
-        }
+def read_raw_index(output_dir: Path, zip_code: str, interval: int = INTERVAL_MINUTES) -> dict:
+    path = raw_index_path(output_dir, zip_code, interval)
+    if not path.exists():
+        return {"years": {}, "failed": {}, "tmy": None}
+    index = json.loads(path.read_text())
+    # Storage retention may have deleted some years; those have to be fetched again
+    store = get_store(output_dir)
+    index["years"] = {
+        year: attributes for year, attributes in index["years"].items()
+        if store.exists(raw_year_path(output_dir, zip_code, int(year), interval))
+    }
+    return index
 
-        print(f"Requesting NREL data for ZIP {zip_code} (Year: {year})...")
-        response = requests.get(BASE_URL, params=params)
 
-        if response.status_code != 200:
-            print(f"Error fetching NREL data for {year}: {response.status_code} - {response.text}")
-            return None
+def write_raw_index(output_dir: Path, zip_code: str, index: dict, interval: int = INTERVAL_MINUTES):
+    path = raw_index_path(output_dir, zip_code, interval)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(index, indent=1))
 
-        # Define a unique temporary file path for each year
-        temp_file_path = output_dir / f"nrel_temp_{zip_code}_{year}.csv"
 
-        try:
-            # Write the API response to the temporary file
-            temp_file_path.write_text(response.text)
+def recently_failed(index: dict, year: int) -> bool:
+    failed_at = index["failed"].get(str(year))
+    if failed_at is None:
+        return False
+    age = datetime.now(timezone.utc) - datetime.fromisoformat(failed_at)
+    return age.total_seconds() < RETRY_FAILED_YEAR_HOURS * 3600
 
-            # Read the data from the temporary file
-            df = pd.read_csv(temp_file_path, skiprows=2)
+
+def fetch_nrel_year(zip_code: str, lat: float, lon: float, year: int,
+                    attributes: list[str], output_dir: Path,
+                    interval: int = INTERVAL_MINUTES) -> pd.DataFrame | None:
+    """
+    Downloads one year of NSRDB data for the given attributes.
+    Returns a DataFrame with pvlib column names and a UTC index, or None on failure.
+    """
+    params = {
+        "api_key": NREL_API_KEY, "wkt": f"POINT({lon:.4f} {lat:.4f})", "names": str(year),
+        "leap_day": "false", "interval": str(interval), "utc": "true", "full_name": USER_NAME,
+        "email": EMAIL, "affiliation": "Portfolio Project", "reason": REASON,
+        "attributes": ",".join(attributes),
+    }
+
+    print(f"Requesting NREL data for ZIP {zip_code} (Year: {year}, attributes: {params['attributes']})...")
+    nrel_rate_limiter.wait()
+    url = BASE_URL if interval >= 30 else SUBHOURLY_BASE_URL
+    try:
+        response = requests.get(url, params=params)
+    except requests.RequestException as e:
+        print(f"Error fetching NREL data for {year}: {e}")
+        return None
+
+    if response.status_code == 429:
+        nrel_rate_limiter.back_off(retry_after_seconds(response))
+    if response.status_code != 200:
+        print(f"Error fetching NREL data for {year}: {response.status_code} - {response.text}")
+        return None
+
+    try:
+        # Parse the response directly; a temp file would only be left behind if we crash
+        with memory_stage("nrel_parse_year"):
+            df = pd.read_csv(StringIO(response.text), skiprows=2)
 
             df['timestamp'] = pd.to_datetime(df[['Year', 'Month', 'Day', 'Hour', 'Minute']])
             df = df.set_index('timestamp').tz_localize('UTC')
-            all_years_dfs.append(df)
+            df = df.rename(columns={csv_col: pvlib_col for csv_col, pvlib_col in NSRDB_COLUMNS.values()})
             print(f" -> Success for {year}.")
+            return df[[NSRDB_COLUMNS[attribute][1] for attribute in attributes]]
 
-        except Exception as e:
-            print(f" -> Failed to parse data for {year}: {e}")
-            return None
-        finally:
-            # Ensure the temporary file is always deleted
-            if temp_file_path.exists():
-                temp_file_path.unlink()
+    except Exception as e:
+        print(f" -> Failed to parse data for {year}: {e}")
+        return None
 
-        time.sleep(1) # Delay between API calls
 
-    if not all_years_dfs:
-        print("No data was successfully fetched.")
-        return None
+def average_years(store: DataStore, year_paths: list[Path], columns: list[str],
+                  interval: int = INTERVAL_MINUTES) -> pd.DataFrame:
+    """
+    Averages several per-year files into one representative year (UTC index).
 
-    # Combine all yearly DataFrames
-    multi_year_df = pd.concat(all_years_dfs)
+    The files are streamed in month-sized chunks and folded into running sums and
+    counts, so memory stays at about one year of output no matter how many years
+    (or how fine an interval) are averaged.
+    """
+    chunk_rows = 31 * 24 * 60 // interval
+    sums, counts = None, None
 
-    # Calculate the average for each hour of the year
-    print("\nAveraging data across all years...")
-    tmy_df = multi_year_df.groupby([
-        multi_year_df.index.month, multi_year_df.index.day, multi_year_df.index.hour
-    ]).mean()
-    tmy_df.index.names = ['Month', 'Day', 'Hour']
+    for year_path in year_paths:
+        for chunk in store.iter_batches(year_path, chunk_rows, columns):
+            # Hourly NSRDB stamps are at :30, so the minute is floored to the interval
+            keys = [chunk.index.month, chunk.index.day, chunk.index.hour,
+                    chunk.index.minute // interval * interval]
+            grouped = chunk.groupby(keys)
+            if sums is None:
+                sums, counts = grouped.sum(), grouped.count()
+            else:
+                sums = sums.add(grouped.sum(), fill_value=0)
+                counts = counts.add(grouped.count(), fill_value=0)
+
+    # Sums are accumulated in float64; the averages only need float32
+    tmy_df = (sums / counts).astype(np.float32)
+    tmy_df.index.names = ['Month', 'Day', 'Hour', 'Minute']
 
     # Create a new DatetimeIndex for the representative year
     tmy_index = pd.to_datetime(
         f'{REPRESENTATIVE_YEAR}-' + tmy_df.index.get_level_values('Month').astype(str) + '-' +
         tmy_df.index.get_level_values('Day').astype(str) + ' ' +
-        tmy_df.index.get_level_values('Hour').astype(str) + ':00'
+        tmy_df.index.get_level_values('Hour').astype(str) + ':' +
+        tmy_df.index.get_level_values('Minute').astype(str)
     )
     tmy_df.index = tmy_index.tz_localize('UTC')
+    return tmy_df
 
-    # Rename and select final columns for pvlib
-    rename_map = {
-        'GHI': 'ghi', 'DHI': 'dhi', 'DNI': 'dni',
-        'Temperature': 'temp_air', 'Wind Speed': 'wind_speed'
-    }
-    tmy_df = tmy_df.rename(columns=rename_map)
-    final_df = tmy_df[list(rename_map.values())]
+
+def fetch_and_average_nrel_data(zip_code: str, output_dir: Path, interval: int = INTERVAL_MINUTES) -> Path | None:
+    """
+    Fetches and averages NREL data (hourly by default, or 5/15/30-minute) for
+    multiple years to create a TMY file.
+
+    Each year is stored separately under output_dir/nrel_raw, so only years or
+    attributes that are not cached yet are downloaded. The TMY file is rebuilt
+    from the cached years whenever YEARS_TO_FETCH or PVLIB_ATTRIBUTES change.
+    If some years fail, the TMY is built from the years that succeeded.
+    """
+    if interval not in VALID_INTERVALS:
+        raise ValueError(f"interval must be one of {VALID_INTERVALS}")
+    attributes = PVLIB_ATTRIBUTES.split(",")
+    unknown = [attribute for attribute in attributes if attribute not in NSRDB_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unsupported NSRDB attributes {unknown}; add them to NSRDB_COLUMNS")
+
+    store = get_store(output_dir)
+    output_path = tmy_path(output_dir, zip_code, interval)
+    index = read_raw_index(output_dir, zip_code, interval)
+
+    # Years we expect in the TMY: everything configured except years that failed recently
+    wanted_years = [year for year in YEARS_TO_FETCH if not recently_failed(index, year)]
+    if (index["tmy"] is None and store.exists(output_path)
+            and not raw_index_path(output_dir, zip_code, interval).exists()):
+        # Written by a version without the per-year cache, which used the same settings
+        print(f"Adopting existing TMY file for ZIP {zip_code}")
+        index["tmy"] = {"years": wanted_years, "attributes": attributes}
+        write_raw_index(output_dir, zip_code, index, interval)
+    if store.exists(output_path) and index["tmy"] == {"years": wanted_years, "attributes": attributes}:
+        print(f"Using cached TMY file {output_path}")
+        return output_path
+
+    # Work out what is missing from the per-year cache
+    missing = {}
+    for year in wanted_years:
+        missing_attributes = [a for a in attributes if a not in index["years"].get(str(year), [])]
+        if missing_attributes:
+            missing[year] = missing_attributes
+
+    if missing:
+        location_data = get_ZIP_data(zip_code)
+        if not location_data:
+            print(f"Could not get location data for ZIP {zip_code}")
+            return output_path if store.exists(output_path) else None
+        lat, lon, elevation, timezone_str, _ = location_data
+
+    # Fetch only the missing years/attributes and merge them into the per-year cache
+    for year, missing_attributes in missing.items():
+        new_df = fetch_nrel_year(zip_code, lat, lon, year, missing_attributes, output_dir, interval)
+        if new_df is None:
+            index["failed"][str(year)] = datetime.now(timezone.utc).isoformat()
+            write_raw_index(output_dir, zip_code, index, interval)
+            continue
+
+        year_path = raw_year_path(output_dir, zip_code, year, interval)
+        cached_df = store.read(year_path) if str(year) in index["years"] else None
+        if cached_df is not None:
+            new_df = cached_df.drop(columns=new_df.columns, errors="ignore").join(new_df)
+        store.write(year_path, new_df)
+
+        index["years"][str(year)] = sorted(set(index["years"].get(str(year), [])) | set(missing_attributes))
+        index["failed"].pop(str(year), None)
+        write_raw_index(output_dir, zip_code, index, interval)
+
+    # Rebuild the TMY from every configured year that now has all attributes
+    columns = [NSRDB_COLUMNS[attribute][1] for attribute in attributes]
+    available_years = [
+        year for year in YEARS_TO_FETCH
+        if set(attributes) <= set(index["years"].get(str(year), []))
+    ]
+    if not available_years:
+        if store.exists(output_path):
+            # Out of date, but better than no estimate at all
+            print("No data was successfully fetched; using the existing TMY file.")
+            return output_path
+        print("No data was successfully fetched.")
+        return None
+    if len(available_years) < len(YEARS_TO_FETCH):
+        print(f"Building TMY from {available_years} only; other years are unavailable.")
+
+    print("\nAveraging data across all years...")
+    year_paths = [raw_year_path(output_dir, zip_code, year, interval) for year in available_years]
+    with memory_stage("average_years"):
+        final_df = average_years(store, year_paths, columns, interval)
 
     # Save the final TMY file
-    output_dir.mkdir(parents=True, exist_ok=True)
-    output_path = output_dir / f"nrel_tmy_{zip_code}.csv"
-    final_df.to_csv(output_path)
+    store.write(output_path, final_df)
+    index["tmy"] = {"years": available_years, "attributes": attributes}
+    write_raw_index(output_dir, zip_code, index, interval)
 
-    print(f"Successfully created TMY file with {len(final_df)} hourly records.")
+    print(f"Successfully created TMY file with {len(final_df)} {interval}-minute records.")
     return output_path
 
+
+def load_tmy_weather(zip_code: str, output_dir: Path = DATA_DIR,
+                     interval: int = INTERVAL_MINUTES) -> pd.DataFrame | None:
+    """
+    Returns the TMY weather DataFrame (UTC index) for a ZIP, fetching it if needed.
+    Loaded DataFrames are kept in tmy_weather_cache.
+    """
+    # The key includes the fetch settings so a config change never serves stale weather
+    cache_key = (str(zip_code), interval, tuple(YEARS_TO_FETCH), PVLIB_ATTRIBUTES)
+    weather_data = tmy_weather_cache.get(cache_key)
+    if weather_data is not None:
+        return weather_data
+
+    with _zip_locks_lock:
+        zip_lock = _zip_locks.setdefault(str(zip_code), threading.Lock())
+    with zip_lock:
+        # Another thread may have loaded it while we waited for the lock
+        weather_data = tmy_weather_cache.get(cache_key)
+        if weather_data is not None:
+            return weather_data
+
+        weather_path = fetch_and_average_nrel_data(zip_code=zip_code, output_dir=output_dir, interval=interval)
+        if not weather_path:
+            return None
+
+        with memory_stage("load_tmy"):
+            weather_data = get_store(output_dir).read(weather_path)
+        if weather_data is None:
+            return None
+        # float32 halves the cached size; NSRDB values only have one decimal anyway
+        weather_data = weather_data.astype(np.float32)
+        tmy_weather_cache.set(cache_key, weather_data)
+        return weather_data
+
+
+def weather_fingerprint(zip_code: str, output_dir: Path = DATA_DIR,
+                        interval: int = INTERVAL_MINUTES) -> str | None:
+    """
+    Short hash identifying the TMY weather currently used for a ZIP (the years and
+    attributes it was built from plus the file's size and modification time).
+    Returns None if there is no TMY file yet. Does not touch the network.
+    """
+    output_path = tmy_path(output_dir, zip_code, interval)
+    if not output_path.exists():
+        return None
+    stat = output_path.stat()
+    tmy_info = read_raw_index(output_dir, zip_code, interval)["tmy"]
+    fingerprint = json.dumps([tmy_info, stat.st_size, stat.st_mtime_ns], sort_keys=True)
+    return hashlib.sha256(fingerprint.encode()).hexdigest()[:16]
+
 # Test
 if __name__ == "__main__":
     test_zip = "83333"
@@ -120,6 +352,6 @@ if __name__ == "__main__":
     if file_path:
         print(f"\n Success! TMY data saved to: {file_path.resolve()}")
         print("\n--- TMY File Head ---")
-        print(pd.read_csv(file_path, index_col=0, parse_dates=True).head())
+        print(get_store(DATA_DIR).read(file_path).head())
     else:
         print(f"\n Failed to get data for ZIP {test_zip}.")
\ No newline at end of file
@@ -9,16 +9,44 @@ Requirements:
 import requests
 import pandas as pd
 from pathlib import Path
+import config
 from config import *
+from rate_limit import RateLimiter, retry_after_seconds
 
-def fetch_openweather(lat: float, lon: float) -> pd.DataFrame | None:
+OPENWEATHER_URL = "https://api.openweathermap.org/data/3.0/onecall"
+
+# OpenWeather refreshes its One Call forecast model about every 10 minutes,
+# so cached forecasts older than this are stale.
+FORECAST_TTL_SECONDS = 10 * 60
+
+# One Call 3.0 includes 1,000 calls per day; calls beyond that are billed.
+# Set OPENWEATHER_MAX_PER_DAY in config.py for a different subscription.
+OPENWEATHER_MAX_PER_DAY = getattr(config, "OPENWEATHER_MAX_PER_DAY", 1000)
+openweather_rate_limiter = RateLimiter("openweather", min_interval=1.0, max_per_day=OPENWEATHER_MAX_PER_DAY)
+
+# OpenWeather hourly field --> column name used in our DataFrames
+HOURLY_FIELDS = {
+    "temp": "temperature",
+    "feels_like": "feels_like",
+    "humidity": "humidity",
+    "clouds": "cloud_cover",
+    "wind_speed": "wind_speed",
+    "wind_gust": "wind_gust",
+    "pressure": "pressure",
+    "dew_point": "dew_point",
+    "uvi": "uvi",
+    "pop": "precip_prob",
+}
+
+def fetch_openweather(lat: float, lon: float, save_csv: bool = False) -> pd.DataFrame | None:
     """
     Fetch 48-hour forecast for a location
 
     Parameters:
     - lat, lon: coordinates
+    - save_csv: also write the forecast to DATA_DIR
     """
-    url = "https://api.openweathermap.org/data/3.0/onecall"
+    url = OPENWEATHER_URL
     params = {
         "lat": lat,
         "lon": lon,
@@ -26,7 +54,12 @@ def fetch_openweather(lat: float, lon: float) -> pd.DataFrame | None:
         "units": "metric"
     }
 
+    if not openweather_rate_limiter.wait(block=False):
+        print(f"OpenWeather daily quota of {openweather_rate_limiter.max_per_day} calls used up; not fetching.")
+        return None
     response = requests.get(url, params=params)
+    if response.status_code == 429:
+        openweather_rate_limiter.back_off(retry_after_seconds(response))
     if response.status_code != 200:
         print(f"Error fetching OpenWeather data: {response.status_code}")
         return None
@@ -39,33 +72,23 @@ def fetch_openweather(lat: float, lon: float) -> pd.DataFrame | None:
         print("No 'hourly' forecast data returned.")
         return None
 
-    records = []
-    for hour in hourly_data:
-        records.append({
-            "timestamp": pd.to_datetime(hour["dt"], unit="s"),
-            "lat": lat,
-            "lon": lon,
-            "temperature": hour.get("temp"),
-            "feels_like": hour.get("feels_like"),
-            "humidity": hour.get("humidity"),
-            "cloud_cover": hour.get("clouds"),
-            "wind_speed": hour.get("wind_speed"),
-            "wind_gust": hour.get("wind_gust"),
-            "pressure": hour.get("pressure"),
-            "dew_point": hour.get("dew_point"),
-            "uvi": hour.get("uvi"),
-            "precip_prob": hour.get("pop")
-        })
-
-    df = pd.DataFrame(records)
+    # Build all columns at once. reindex() fills fields missing from the response
+    # (e.g. wind_gust on calm hours) with NaN.
+    df = pd.DataFrame.from_records(hourly_data).reindex(columns=["dt", *HOURLY_FIELDS])
+    df = df.rename(columns=HOURLY_FIELDS)
+    unix_timestamp = df.pop("dt")
+    df.insert(0, "timestamp", pd.to_datetime(unix_timestamp, unit="s"))
+    df.insert(1, "lat", lat)
+    df.insert(2, "lon", lon)
+    df['unix_timestamp'] = unix_timestamp
 
-    csv_file = DATA_DIR / f"openweather_hourly_forecast_{lat:.4f}_{lon:.4f}.csv"
-    df['unix_timestamp'] = df['timestamp'].astype(int) // 10 ** 9
-    df.to_csv(csv_file, index=False)
-    print(f"Saved {len(df)} hourly forecast records to {csv_file.resolve()}")
+    if save_csv:
+        csv_file = DATA_DIR / f"openweather_hourly_forecast_{lat:.4f}_{lon:.4f}.csv"
+        df.to_csv(csv_file, index=False)
+        print(f"Saved {len(df)} hourly forecast records to {csv_file.resolve()}")
     return df
 
 if __name__ == "__main__":
     # Example: Hailey, ID
     lat, lon = 43.5196, -114.3153
-    fetch_openweather(lat, lon)
+    fetch_openweather(lat, lon, save_csv=True)
@@ -0,0 +1,215 @@
+"""
+Aggregates production for a fleet (portfolio) of installed systems.
+
+Running run_pvlib_model once per system is slow and keeps one Series per system
+in memory. Instead, systems are grouped by weather cell and orientation, the
+model is run once per group for a normalized 1 kW system, and each group's
+profile is scaled by the group's capacity and added into preallocated arrays
+(one row per utility territory, time zone, ...). Weather is loaded one cell at a
+time, so memory is bounded by the size of the output arrays.
+
+The normalized profile scales exactly with capacity because the inverter is
+sized to the array (pdc0 = capacity), which keeps the pvwatts model linear in
+capacity for a fixed loss fraction.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+from SystemConfig import SystemConfig, TRACKING_TYPES
+from ZIP_data import get_ZIP_data_bulk
+from nrel_data_avg import load_tmy_weather
+from run_pvlib import run_model_on_weather
+
+# NSRDB v4 is on a ~4 km (0.04 degree) grid. Systems in the same cell share weather.
+WEATHER_CELL_DEG = 0.04
+
+# Columns a systems table may have, with the default used when missing
+SYSTEM_DEFAULTS = {
+    "system_losses": 0.14,
+    "tilt_deg": 20.0,
+    "azimuth_deg": 180.0,
+    "max_angle": 60.0,
+    "tracking_type": "fixed",
+    "utility": "unknown",
+}
+REQUIRED_COLUMNS = ["zip_code", "system_capacity_kw"]
+NUMERIC_COLUMNS = ["system_capacity_kw", "system_losses", "tilt_deg", "azimuth_deg", "max_angle"]
+
+ORIENTATION_COLUMNS = ["tracking_type", "tilt_deg", "azimuth_deg", "max_angle", "system_losses"]
+
+
+def prepare_systems(systems: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Fills defaults and attaches location, time zone and weather cell to each system.
+    Returns (usable systems, skipped systems). Systems are skipped if a numeric
+    column isn't a number, the tracking type is unknown or the ZIP can't be located.
+    """
+    missing = [column for column in REQUIRED_COLUMNS if column not in systems.columns]
+    if missing:
+        raise ValueError(f"systems table is missing required columns {missing}")
+
+    systems = systems.copy()
+    for column, default in SYSTEM_DEFAULTS.items():
+        if column not in systems.columns:
+            systems[column] = default
+        systems[column] = systems[column].fillna(default)
+    systems["zip_code"] = systems["zip_code"].astype(str).str.split("-").str[0].str.strip().str.zfill(5)
+    systems["tracking_type"] = systems["tracking_type"].astype(str).str.strip().str.lower()
+
+    # Check every row up front so one bad row can't stop the run partway through
+    numeric = systems[NUMERIC_COLUMNS].apply(pd.to_numeric, errors="coerce")
+    valid = numeric.notna().all(axis=1) & systems["tracking_type"].isin(TRACKING_TYPES)
+    invalid = systems[~valid]
+    if not invalid.empty:
+        print(f"Skipping {len(invalid)} systems with invalid values (rows {list(invalid.index)}).")
+    systems = systems[valid].copy()
+    systems[NUMERIC_COLUMNS] = numeric[valid]
+
+    # Single-axis trackers here are north-south, so their azimuth input is unused
+    systems.loc[systems["tracking_type"] == "single-axis", "azimuth_deg"] = 0.0
+
+    # One bulk (cached, mostly offline) location lookup for all unique ZIPs
+    locations = get_ZIP_data_bulk(systems["zip_code"].unique())
+    located = systems["zip_code"].map(lambda zip_code: locations[zip_code] is not None)
+    skipped = pd.concat([invalid, systems[~located]])
+    systems = systems[located].copy()
+
+    systems["latitude"] = systems["zip_code"].map(lambda zip_code: locations[zip_code][0])
+    systems["longitude"] = systems["zip_code"].map(lambda zip_code: locations[zip_code][1])
+    systems["tz"] = systems["zip_code"].map(lambda zip_code: locations[zip_code][3])
+    systems["location_source"] = systems["zip_code"].map(lambda zip_code: locations[zip_code][4])
+    systems["cell_lat"] = (systems["latitude"] / WEATHER_CELL_DEG).round().astype(int)
+    systems["cell_lon"] = (systems["longitude"] / WEATHER_CELL_DEG).round().astype(int)
+    return systems, skipped
+
+
+def run_portfolio(systems: pd.DataFrame, group_by: tuple[str, ...] = ("utility", "tz"),
+                  day_tz: str | None = None) -> dict:
+    """
+    Computes fleet production for a table of systems.
+
+    systems needs zip_code and system_capacity_kw columns, and may have the other
+    SYSTEM_DEFAULTS columns plus any columns named in group_by.
+
+    Returns a dict with:
+      "fleet":   {"hourly", "daily", "monthly"} Series of kWh for the whole fleet
+      <column>:  {"hourly", "daily", "monthly"} DataFrames of kWh, one column per
+                 value of each group_by column (e.g. per utility, per time zone)
+      "skipped": systems with invalid values, an unknown ZIP or no weather
+    Hourly times are UTC. Daily and monthly totals are indexed by local date: the
+"tz" breakdown uses each column's own time zone, everything else day_tz
+(default: the time zone with the most capacity).
+    """
+    systems, skipped = prepare_systems(systems)
+    if systems.empty:
+        raise ValueError("No systems with a known location.")
+
+    labels = {column: sorted(systems[column].astype(str).unique()) for column in group_by}
+    label_rows = {column: {label: row for row, label in enumerate(labels[column])} for column in group_by}
+
+    time_index = None
+    fleet = None
+    totals = {}
+
+    # Sorting by cell means each cell's weather is loaded once and then dropped
+    for (cell_lat, cell_lon), cell_systems in systems.groupby(["cell_lat", "cell_lon"], sort=True):
+        representative_zip = cell_systems["zip_code"].iloc[0]
+        weather_data = load_tmy_weather(representative_zip)
+        if weather_data is None:
+            print(f"No weather for cell ({cell_lat}, {cell_lon}); skipping {len(cell_systems)} systems.")
+            skipped = pd.concat([skipped, cell_systems])
+            continue
+
+        for orientation, group in cell_systems.groupby(ORIENTATION_COLUMNS, sort=False):
+            tracking_type, tilt_deg, azimuth_deg, max_angle, system_losses = orientation
+
+            # Normalized 1 kW system for this cell and orientation
+            unit_config = SystemConfig(
+                zip_code=representative_zip, system_capacity_kw=1.0, module_efficiency=0.20,
+                system_losses=system_losses, tilt_deg=tilt_deg, azimuth_deg=azimuth_deg,
+                max_angle=max_angle, tracking_type=tracking_type
+            )
+            profile = run_model_on_weather(unit_config, weather_data)
+
+            if time_index is None:
+                # Preallocate every accumulator once the time axis is known
+                time_index = profile.index
+                fleet = np.zeros(len(time_index))
+                totals = {column: np.zeros((len(labels[column]), len(time_index))) for column in group_by}
+                step_hours = (time_index[1] - time_index[0]).total_seconds() / 3600
+            elif len(profile) != len(time_index):
+                raise ValueError("All weather cells must share the same time axis.")
+
+            profile_kwh = profile.to_numpy(dtype=np.float64) * step_hours / 1000  # W --> kWh per kW
+            fleet += group["system_capacity_kw"].sum() * profile_kwh
+            for column in group_by:
+                capacity = group.groupby(group[column].astype(str))["system_capacity_kw"].sum()
+                rows = [label_rows[column][label] for label in capacity.index]
+                totals[column][rows] += np.outer(capacity.to_numpy(), profile_kwh)
+
+    if time_index is None:
+        raise ValueError("No weather could be loaded for any system.")
+
+    if day_tz is None:
+        day_tz = systems.groupby("tz")["system_capacity_kw"].sum().idxmax()
+    results = {"fleet": summarize(pd.Series(fleet, index=time_index, name="fleet_kwh"), day_tz)}
+    for column in group_by:
+        energy = pd.DataFrame(totals[column].T, index=time_index, columns=labels[column])
+        results[column] = summarize_by_zone(energy) if column == "tz" else summarize(energy, day_tz)
+    results["skipped"] = skipped
+    return results
+
+
+def local_totals(hourly_kwh, tz: str) -> tuple:
+    """
+    Daily and monthly totals over local days in tz, indexed by tz-naive local date.
+    The weather is a single typical UTC year, so the hours that fall in the
+    previous local year are moved to the end of the same year.
+    """
+    local_kwh = hourly_kwh.tz_convert(tz).tz_localize(None)
+    before = local_kwh.index.year < local_kwh.index[-1].year
+    local_kwh.index = local_kwh.index.where(~before, local_kwh.index + pd.DateOffset(years=1))
+    local_kwh = local_kwh.sort_index()
+    return local_kwh.resample("D").sum(), local_kwh.resample("ME").sum()
+
+
+def summarize(energy_kwh, day_tz: str = "UTC"):
+    """
+    Hourly (UTC), daily and monthly kWh totals from a kWh-per-interval
+    Series/DataFrame. Days and months are local to day_tz.
+    """
+    hourly_kwh = energy_kwh.tz_convert("UTC").resample("h").sum()
+    daily_kwh, monthly_kwh = local_totals(hourly_kwh, day_tz)
+    return {"hourly": hourly_kwh, "daily": daily_kwh, "monthly": monthly_kwh}
+
+
+def summarize_by_zone(energy_kwh: pd.DataFrame):
+    """Same as summarize for one column per time zone, with each column's days in its own zone."""
+    hourly_kwh = energy_kwh.tz_convert("UTC").resample("h").sum()
+    daily, monthly = {}, {}
+    for tz in hourly_kwh.columns:
+        daily[tz], monthly[tz] = local_totals(hourly_kwh[tz], tz)
+    return {"hourly": hourly_kwh, "daily": pd.DataFrame(daily), "monthly": pd.DataFrame(monthly)}
+
+
+def run_portfolio_csv(csv_path: Path, group_by: tuple[str, ...] = ("utility", "tz"),
+                      day_tz: str | None = None) -> dict:
+    """Same as run_portfolio, reading the systems table from a CSV file."""
+    return run_portfolio(pd.read_csv(csv_path, dtype={"zip_code": str}), group_by=group_by, day_tz=day_tz)
+
+
+# Test
+if __name__ == "__main__":
+    example_systems = pd.DataFrame({
+        "zip_code": ["83333", "83333", "83702", "83702", "91106"],
+        "system_capacity_kw": [7.5, 5.0, 10.0, 6.0, 4.0],
+        "tilt_deg": [25, 25, 20, 20, 30],
+        "azimuth_deg": [180, 180, 180, 180, 200],
+        "tracking_type": ["fixed", "fixed", "single-axis", "single-axis", "fixed"],
+        "utility": ["Idaho Power", "Idaho Power", "Idaho Power", "Idaho Power", "SCE"],
+    })
+    results = run_portfolio(example_systems)
+    print(f"Fleet annual generation: {results['fleet']['hourly'].sum():,.0f} kWh")
+    print(results["utility"]["monthly"].round(0))
+    print(results["tz"]["monthly"].round(0))
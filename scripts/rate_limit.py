@@ -0,0 +1,91 @@
+"""
+Defines a simple thread-safe rate limiter shared by everything that calls an external API.
+"""
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """
+    Enforces a minimum spacing between calls and optional hourly and daily quotas.
+    Call wait() right before each request.
+    """
+    def __init__(self, name: str, min_interval: float = 1.0, max_per_hour: int | None = None,
+                 max_per_day: int | None = None):
+        self.name = name
+        self.min_interval = min_interval
+        self.max_per_hour = max_per_hour
+        self.max_per_day = max_per_day
+        self._calls = deque()  # monotonic times of calls in the last day
+        self._next_allowed = 0.0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        window = 86400 if self.max_per_day is not None else 3600
+        while self._calls and now - self._calls[0] > window:
+            self._calls.popleft()
+
+    def _calls_in_last(self, now: float, seconds: float) -> int:
+        return sum(1 for call in self._calls if now - call <= seconds)
+
+    def _quota_delay(self, now: float) -> float:
+        """Seconds until the hourly and daily quotas allow another call."""
+        delay = 0.0
+        if self.max_per_hour is not None:
+            last_hour = [call for call in self._calls if now - call <= 3600]
+            if len(last_hour) >= self.max_per_hour:
+                delay = max(delay, last_hour[-self.max_per_hour] + 3600 - now)
+        if self.max_per_day is not None and len(self._calls) >= self.max_per_day:
+            delay = max(delay, self._calls[-self.max_per_day] + 86400 - now)
+        return delay
+
+    def wait(self, block: bool = True) -> bool:
+        """
+        Blocks until a request is allowed, then records it and returns True.
+        With block=False, returns False right away if a quota is used up (waiting
+        for a daily quota could take hours).
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._prune(now)
+                quota_delay = self._quota_delay(now)
+                if quota_delay > 0 and not block:
+                    return False
+                delay = max(self._next_allowed - now, quota_delay)
+                if delay <= 0:
+                    self._calls.append(now)
+                    self._next_allowed = now + self.min_interval
+                    return True
+            time.sleep(delay)
+
+    def back_off(self, seconds: float):
+        """Pauses all callers, e.g. after the API answers 429 Too Many Requests."""
+        with self._lock:
+            self._next_allowed = max(self._next_allowed, time.monotonic() + seconds)
+
+    def remaining(self) -> int | None:
+        """Requests left in the current hour (None if there is no hourly quota)."""
+        if self.max_per_hour is None:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._prune(now)
+            return self.max_per_hour - self._calls_in_last(now, 3600)
+
+    def remaining_today(self) -> int | None:
+        """Requests left in the last 24 hours (None if there is no daily quota)."""
+        if self.max_per_day is None:
+            return None
+        with self._lock:
+            self._prune(time.monotonic())
+            return self.max_per_day - len(self._calls)
+
+
+def retry_after_seconds(response, default: float = 60.0) -> float:
+    """Reads the Retry-After header of a 429 response, falling back to a default."""
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except (TypeError, ValueError):
+        return default
@@ -0,0 +1,120 @@
+"""
+Evaluates several system configurations (scenarios) for one ZIP, e.g. fixed vs.
+single-axis or a few tilts, for the dashboard's comparison mode.
+
+The weather is loaded once and the scenarios that aren't already in
+results_cache are run. pvlib is mostly single-threaded numpy, so with more than
+one CPU they run on a process pool (started on first use and reused). Each task
+pickles the weather to a worker, which only pays off for several scenarios on
+several CPUs; otherwise, e.g. hourly runs of ~70 ms on one CPU, they run here
+one after another. Call warm_pool() at startup so the first comparison doesn't
+wait for the workers to start and import pandas and pvlib.
+"""
+import os
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from run_pvlib import load_local_weather, run_model_for_interval, results_cache
+
+MAX_SCENARIOS = 4
+SCENARIO_WORKERS = min(MAX_SCENARIOS, os.cpu_count() or 1)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn, not fork: the dashboard process has server and cache threads running
+            _pool = ProcessPoolExecutor(max_workers=SCENARIO_WORKERS, mp_context=get_context("spawn"))
+        return _pool
+
+
+def _warm_worker():
+    """No-op task. Unpickling it makes a new worker import this module and pvlib."""
+    return os.getpid()
+
+
+def warm_pool():
+    """Starts every pool worker in the background. Does nothing when scenarios run in-process."""
+    if SCENARIO_WORKERS == 1:
+        return
+    pool = get_pool()
+    for _ in range(SCENARIO_WORKERS):
+        pool.submit(_warm_worker)
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def run_scenarios(system_configs: list) -> list:
+    """
+    Runs every config on the same weather. All configs must share a ZIP and interval.
+    Returns AC power Series (W) in the same order as system_configs.
+    """
+    if not system_configs:
+        return []
+    if len(system_configs) > MAX_SCENARIOS:
+        raise ValueError(f"At most {MAX_SCENARIOS} scenarios can be compared at once.")
+    first = system_configs[0]
+    if any((c.zip_code, c.interval_minutes) != (first.zip_code, first.interval_minutes) for c in system_configs):
+        raise ValueError("All scenarios must use the same ZIP code and data interval.")
+
+    start = time.monotonic()
+    results = [results_cache.get(config.cache_key()) for config in system_configs]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        weather_data = load_local_weather(first)
+        if SCENARIO_WORKERS == 1 or len(missing) == 1:
+            for i in missing:
+                results[i] = run_model_for_interval(system_configs[i], weather_data)
+        else:
+            _run_on_pool(system_configs, weather_data, results, missing)
+        for i in missing:
+            results_cache.set(system_configs[i].cache_key(), results[i])
+
+    print(f"Ran {len(missing)} of {len(system_configs)} scenarios in {time.monotonic() - start:.2f} s "
+          f"({len(system_configs) - len(missing)} cached).")
+    return results
+
+
+def _run_on_pool(system_configs: list, weather_data, results: list, missing: list):
+    """Runs the missing scenarios on the process pool and fills them into results."""
+    try:
+        pool = get_pool()
+        futures = {i: pool.submit(run_model_for_interval, system_configs[i], weather_data) for i in missing}
+        for i, future in futures.items():
+            results[i] = future.result()
+    except BrokenProcessPool:
+        # A worker died (e.g. out of memory); start a fresh pool next time and finish here
+        print("Scenario worker pool broke; running the remaining scenarios in-process.")
+        _reset_pool()
+        for i in missing:
+            if results[i] is None:
+                results[i] = run_model_for_interval(system_configs[i], weather_data)
+
+
+# Test
+if __name__ == "__main__":
+    from SystemConfig import SystemConfig
+    from run_pvlib import energy_kwh
+
+    base = dict(zip_code="83333", system_capacity_kw=7.5, module_efficiency=0.20, system_losses=0.14,
+                azimuth_deg=180, max_angle=60)
+    configs = [
+        SystemConfig(tilt_deg=20, tracking_type="fixed", **base),
+        SystemConfig(tilt_deg=35, tracking_type="fixed", **base),
+        SystemConfig(tilt_deg=0, tracking_type="single-axis", **base),
+    ]
+    for config, ac_power in zip(configs, run_scenarios(configs)):
+        print(f"{config.tracking_type} tilt {config.tilt_deg}: {energy_kwh(ac_power):,.0f} kWh")
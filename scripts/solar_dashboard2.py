@@ -1,7 +1,10 @@
 
+import os
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, Input, Output, State, no_update
+from dash import dcc, html, Input, Output, State, no_update, ctx
+from flask import jsonify
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 
@@ -9,7 +12,13 @@ import plotly.graph_objects as go
 # IMPORT CUSTOM PROJECT MODULES
 # ==============================================================================
 from SystemConfig import SystemConfig
-from run_pvlib import run_pvlib_model
+from run_pvlib import run_pvlib_model, run_clearsky_estimate, energy_kwh
+from cache_warmer import CacheWarmer, get_warm_zips, record_request
+from estimate_api import register_estimate_api
+from memory_stats import memory_report, memory_stage, start_tracking
+from storage import get_store
+from scenarios import run_scenarios, warm_pool, MAX_SCENARIOS
+import config
 
 
 # ==============================================================================
@@ -17,6 +26,28 @@ from run_pvlib import run_pvlib_model
 # ==============================================================================
 app = dash.Dash(__name__, external_stylesheets=[dbc.themes.FLATLY])
 
+# JSON API (POST /estimate, POST /estimate/batch, POST /forecast) for other services, on the same server
+register_estimate_api(app.server)
+
+
+# Started in __main__; None when the app runs some other way
+cache_warmer = None
+
+
+# Per-stage peak memory (if TRACK_MEMORY is on), per-cache sizes and DATA_DIR usage
+@app.server.route("/memory")
+def memory():
+    return jsonify({**memory_report(), "storage": get_store().stats()})
+
+
+# Progress of the startup cache warm-up
+@app.server.route("/warmup")
+def warmup():
+    if cache_warmer is None:
+        return jsonify({"started": False})
+    return jsonify({"started": True, **cache_warmer.progress()})
+
+
 # --- Reusable styles ---
 input_style = {"marginBottom": "15px"}
 
@@ -25,7 +56,7 @@ app.layout = dbc.Container([
     dbc.Row(dbc.Col(html.H1("Solar Power Production Dashboard"), width=12), className="my-4"),
     dbc.Row([
         # --- Input Column ---
-        dbc.Col(
+        dbc.Col([
             dbc.Card([
                 dbc.CardHeader("System Configuration"),
                 dbc.CardBody([
@@ -40,7 +71,8 @@ app.layout = dbc.Container([
                     dcc.Dropdown(
                         id="tracking-input",
                         options=[{'label': 'Fixed Tilt', 'value': 'fixed'},
-                                 {'label': 'Single-Axis', 'value': 'single-axis'}],
+                                 {'label': 'Single-Axis', 'value': 'single-axis'},
+                                 {'label': 'Dual-Axis', 'value': 'dual-axis'}],
                         value='fixed', clearable=False, style=input_style
                     ),
 
@@ -64,6 +96,16 @@ app.layout = dbc.Container([
                     html.Label("System Losses (%):"),
                     dbc.Input(id="losses-input", value=14, type="number", min=0, max=50, step=1, style=input_style),
 
+                    html.Label("Data Interval:"),
+                    dcc.Dropdown(
+                        id="interval-input",
+                        options=[{'label': 'Hourly', 'value': 60},
+                                 {'label': '30 minutes', 'value': 30},
+                                 {'label': '15 minutes', 'value': 15},
+                                 {'label': '5 minutes', 'value': 5}],
+                        value=60, clearable=False, style=input_style
+                    ),
+
                     # --- ADDED: Date picker for daily profile ---
                     html.Label("Select Day for Hourly Profile:"),
                     dcc.DatePickerSingle(
@@ -78,26 +120,43 @@ app.layout = dbc.Container([
                     dbc.Button("Calculate Production", id="submit-button", color="primary", className="w-100 mt-3")
                 ])
             ]),
-            md=4
-        ),
+            # --- Comparison mode: several system settings on the same ZIP and weather ---
+            dbc.Card([
+                dbc.CardHeader("Compare Scenarios"),
+                dbc.CardBody([
+                    html.P(f"Add the current system settings as a scenario, then compare up to {MAX_SCENARIOS} "
+                           "for the ZIP code and interval above.", className="text-muted"),
+                    dbc.Button("Add Scenario", id="add-scenario-button", color="secondary", className="me-2"),
+                    dbc.Button("Clear", id="clear-scenarios-button", color="link"),
+                    html.Ol(id="scenario-list", className="mt-3"),
+                    dbc.Button("Compare Scenarios", id="compare-button", color="primary", className="w-100"),
+                    dcc.Store(id='scenarios-store', data=[]),
+                ])
+            ], className="mt-3"),
+        ], md=4),
 
         # --- Output Column ---
         dbc.Col(
             dbc.Card([
                 dbc.CardHeader("Predicted Results"),
                 dbc.CardBody([
+                    html.H3(id="total-kwh-output", className="text-center"),
+                    # --- Shows whether the results are the preliminary clear-sky estimate ---
+                    html.Div(id="result-status", className="text-muted text-center"),
                     dcc.Loading(
                         id="loading-spinner",
                         type="circle",
                         children=[
-                            html.H3(id="total-kwh-output", className="text-center"),
                             html.Div(id="error-output", className="text-danger text-center"),
-                            dcc.Graph(id="monthly-graph"),
-                            # --- ADDED: Daily graph and data store ---
-                            dcc.Graph(id="daily-graph"),
-                            dcc.Store(id='results-store')
                         ]
-                    )
+                    ),
+                    dcc.Graph(id="monthly-graph"),
+                    # --- ADDED: Daily graph and data store ---
+                    dcc.Graph(id="daily-graph"),
+                    dcc.Store(id='results-store'),
+                    dcc.Store(id='inputs-store'),
+                    # Comparison results: [{'label': ..., 'results': results_to_store(...)}, ...]
+                    dcc.Store(id='comparison-store')
                 ])
             ]),
             md=8
@@ -124,13 +183,81 @@ def toggle_conditional_inputs(tracking_type):
     return {'display': 'none'}, {'display': 'none'}
 
 
-# --- Main callback to run the model and update the outputs ---
+def build_system_config(inputs, offline_elevation=False):
+    """Creates the SystemConfig object from the form inputs stored in inputs-store."""
+    tracking = inputs['tracking']
+    return SystemConfig(
+        zip_code=str(inputs['zip_code']),
+        system_capacity_kw=float(inputs['capacity']),
+        module_efficiency=0.20,
+        system_losses=float(inputs['losses']) / 100,
+        # --- MODIFIED: Use correct tilt value based on tracking type ---
+        tilt_deg=float(inputs['axis_tilt']) if tracking == 'single-axis' else float(inputs['tilt']),
+        azimuth_deg=float(inputs['azimuth']),
+        tracking_type=tracking,
+        max_angle=float(inputs['max_angle']),
+        interval_minutes=int(inputs.get('interval') or 60),
+        offline_elevation=offline_elevation
+    )
+
+
+def results_to_store(ac_power):
+    """
+    Compact results-store format: start time, time zone, step and whole watts.
+    About a tenth of the size of ac_power.to_json(), which repeats every timestamp.
+    """
+    return {
+        'start': ac_power.index[0].isoformat(),
+        'tz': str(ac_power.index.tz),
+        'interval_minutes': int((ac_power.index[1] - ac_power.index[0]).total_seconds() // 60),
+        'values': np.rint(np.nan_to_num(ac_power.to_numpy())).astype(int).tolist(),
+    }
+
+
+def results_from_store(data):
+    """Rebuilds the AC power series (local time) saved by results_to_store."""
+    index = pd.date_range(
+        pd.Timestamp(data['start']).tz_convert(data['tz']),
+        periods=len(data['values']), freq=f"{data['interval_minutes']}min"
+    )
+    return pd.Series(data['values'], index=index, dtype=np.float32)
+
+
+def build_results_outputs(ac_power, label):
+    """Turns an AC power series into the total text, monthly figure and stored results."""
+    total_kwh = energy_kwh(ac_power)
+    monthly_kwh = energy_kwh(ac_power, 'ME')
+
+    # Create the Plotly figure (bar chart)
+    fig_monthly = go.Figure()
+    fig_monthly.add_trace(go.Bar(
+        x=monthly_kwh.index.strftime('%b'),
+        y=monthly_kwh.values,
+        name='Monthly Production'
+    ))
+    fig_monthly.update_layout(
+        title_text='Average Monthly Energy Production',
+        yaxis_title='Energy (kWh)',
+        xaxis_title='Month'
+    )
+
+    output_text = f"{label}: {total_kwh:,.0f} kWh"
+    with memory_stage("dashboard_store"):
+        stored_results = results_to_store(ac_power)
+    return output_text, fig_monthly, stored_results
+
+
+# --- First callback: instant clear-sky estimate, needs no weather download ---
 @app.callback(
     Output('total-kwh-output', 'children'),
     Output('monthly-graph', 'figure'),
     Output('error-output', 'children'),
     # --- ADDED: Output to data store ---
     Output('results-store', 'data'),
+    Output('result-status', 'children'),
+    Output('inputs-store', 'data'),
+    # A new calculation replaces any comparison on screen
+    Output('comparison-store', 'data'),
     Input('submit-button', 'n_clicks'),
     [State('zip-input', 'value'),
      State('capacity-input', 'value'),
@@ -139,92 +266,199 @@ def toggle_conditional_inputs(tracking_type):
      State('azimuth-input', 'value'),
      State('axis-tilt-input', 'value'),
      State('max-angle-input', 'value'),
-     State('losses-input', 'value')]
+     State('losses-input', 'value'),
+     State('interval-input', 'value')]
 )
-def update_results(n_clicks, zip_code, capacity, tracking, tilt, azimuth, axis_tilt, max_angle, losses):
+def update_preliminary_results(n_clicks, zip_code, capacity, tracking, tilt, azimuth, axis_tilt, max_angle, losses,
+                               interval):
     # Don't run the model when the app first loads
     if n_clicks is None or n_clicks == 0:
         # --- MODIFIED: Return value for the new data store output ---
-        return "", {}, "", None
+        return "", {}, "", None, "", no_update, None
 
+    inputs = {
+        'zip_code': zip_code, 'capacity': capacity, 'tracking': tracking, 'tilt': tilt,
+        'azimuth': azimuth, 'axis_tilt': axis_tilt, 'max_angle': max_angle, 'losses': losses,
+        'interval': interval,
+        'n_clicks': n_clicks,  # makes every click a change, even with identical inputs
+    }
     try:
-        # 1. Create the SystemConfig object from the form inputs
-        config = SystemConfig(
-            zip_code=str(zip_code),
-            system_capacity_kw=float(capacity),
-            module_efficiency=0.20,
-            system_losses=float(losses) / 100,
-            # --- MODIFIED: Use correct tilt value based on tracking type ---
-            tilt_deg=float(axis_tilt) if tracking == 'single-axis' else float(tilt),
-            azimuth_deg=float(azimuth),
-            tracking_type=tracking,
-            max_angle=float(max_angle)
+        # Offline elevation so a slow elevation API can't hold up the quick estimate
+        config = build_system_config(inputs, offline_elevation=True)
+        record_request(config.zip_code)
+        ac_power = run_clearsky_estimate(config)
+        output_text, fig_monthly, stored_results = build_results_outputs(
+            ac_power, "Preliminary Annual Generation (clear-sky estimate)"
         )
+        status = "Preliminary estimate. Loading NSRDB weather data for the final result..."
+        if config.location_source == "nearest":
+            status += f" ZIP {config.zip_code} wasn't found; using the location of a nearby ZIP."
+        # Writing inputs-store triggers update_results below
+        return output_text, fig_monthly, "", stored_results, status, inputs, None
+
+    except Exception as e:
+        # If anything goes wrong, return an error message
+        error_message = f"An error occurred: {e}"
+        return "", {}, error_message, None, "", no_update, no_update
+
+
+# --- Main callback: runs the NSRDB-based model and replaces the preliminary estimate ---
+@app.callback(
+    Output('total-kwh-output', 'children', allow_duplicate=True),
+    Output('monthly-graph', 'figure', allow_duplicate=True),
+    Output('error-output', 'children', allow_duplicate=True),
+    Output('results-store', 'data', allow_duplicate=True),
+    Output('result-status', 'children', allow_duplicate=True),
+    Input('inputs-store', 'data'),
+    prevent_initial_call=True
+)
+def update_results(inputs):
+    if not inputs:
+        return no_update, no_update, no_update, no_update, no_update
+
+    try:
+        # 1. Create the SystemConfig object from the form inputs
+        config = build_system_config(inputs)
 
         # 2. Run the pvlib model
         ac_power = run_pvlib_model(config)
 
-        # 3. Process the results for display
-        total_kwh = ac_power.sum() / 1000
-        monthly_kwh = ac_power.resample('ME').sum() / 1000
+        # 3. Return the results to the output components
+        output_text, fig_monthly, stored_results = build_results_outputs(ac_power, "Predicted Annual Generation")
+        return output_text, fig_monthly, "", stored_results, ""
 
-        # 4. Create the Plotly figure (bar chart)
-        fig_monthly = go.Figure()
-        fig_monthly.add_trace(go.Bar(
-            x=monthly_kwh.index.strftime('%b'),
-            y=monthly_kwh.values,
-            name='Monthly Production'
-        ))
-        fig_monthly.update_layout(
-            title_text='Average Monthly Energy Production',
-            yaxis_title='Energy (kWh)',
-            xaxis_title='Month'
-        )
+    except Exception as e:
+        # Keep the preliminary estimate on screen, but say the final result failed
+        error_message = f"An error occurred: {e}"
+        return no_update, no_update, error_message, no_update, "Showing preliminary clear-sky estimate only."
+
+# --- Comparison mode: collect scenarios from the form ---
+def scenario_label(scenario):
+    if scenario['tracking'] == 'single-axis':
+        orientation = f"Single-axis, {scenario['axis_tilt']}° axis, ±{scenario['max_angle']}°"
+    elif scenario['tracking'] == 'dual-axis':
+        orientation = "Dual-axis"
+    else:
+        orientation = f"Fixed, {scenario['tilt']}° tilt, {scenario['azimuth']}° azimuth"
+    return f"{orientation}, {scenario['capacity']} kW, {scenario['losses']}% losses"
+
+
+@app.callback(
+    Output('scenarios-store', 'data'),
+    Output('scenario-list', 'children'),
+    Input('add-scenario-button', 'n_clicks'),
+    Input('clear-scenarios-button', 'n_clicks'),
+    [State('scenarios-store', 'data'),
+     State('capacity-input', 'value'),
+     State('tracking-input', 'value'),
+     State('tilt-input', 'value'),
+     State('azimuth-input', 'value'),
+     State('axis-tilt-input', 'value'),
+     State('max-angle-input', 'value'),
+     State('losses-input', 'value')],
+    prevent_initial_call=True
+)
+def update_scenarios(add_clicks, clear_clicks, scenarios, capacity, tracking, tilt, azimuth, axis_tilt, max_angle,
+                     losses):
+    if ctx.triggered_id == 'clear-scenarios-button':
+        return [], []
+
+    scenario = {
+        'capacity': capacity, 'tracking': tracking, 'tilt': tilt, 'azimuth': azimuth,
+        'axis_tilt': axis_tilt, 'max_angle': max_angle, 'losses': losses,
+    }
+    items = [html.Li(scenario_label(s)) for s in scenarios]
+    if scenario in scenarios:
+        return no_update, items + [html.Li("These settings are already a scenario.", className="text-danger")]
+    if len(scenarios) >= MAX_SCENARIOS:
+        return no_update, items + [html.Li(f"At most {MAX_SCENARIOS} scenarios.", className="text-danger")]
+
+    scenarios = scenarios + [scenario]
+    return scenarios, items + [html.Li(scenario_label(scenario))]
 
-        # 5. Return the results to the output components
-        output_text = f"Predicted Annual Generation: {total_kwh:,.0f} kWh"
-        # --- MODIFIED: Serialize full results to JSON for the data store ---
-        json_results = ac_power.to_json(date_format='iso', orient='split')
-        return output_text, fig_monthly, "", json_results
 
+# --- Comparison mode: run every scenario on the same weather and overlay the results ---
+@app.callback(
+    Output('total-kwh-output', 'children', allow_duplicate=True),
+    Output('monthly-graph', 'figure', allow_duplicate=True),
+    Output('error-output', 'children', allow_duplicate=True),
+    Output('result-status', 'children', allow_duplicate=True),
+    Output('comparison-store', 'data', allow_duplicate=True),
+    Input('compare-button', 'n_clicks'),
+    [State('scenarios-store', 'data'),
+     State('zip-input', 'value'),
+     State('interval-input', 'value')],
+    prevent_initial_call=True
+)
+def compare_scenarios(n_clicks, scenarios, zip_code, interval):
+    if not scenarios:
+        return no_update, no_update, "Add at least one scenario to compare.", no_update, no_update
+
+    try:
+        configs = [build_system_config({**s, 'zip_code': zip_code, 'interval': interval}) for s in scenarios]
+        record_request(configs[0].zip_code)
+        ac_powers = run_scenarios(configs)
     except Exception as e:
-        # If anything goes wrong, return an error message
-        error_message = f"An error occurred: {e}"
-        # --- MODIFIED: Return value for the new data store output ---
-        return "", {}, error_message, None
+        return no_update, no_update, f"An error occurred: {e}", no_update, no_update
+
+    labels = [f"Scenario {i}" for i in range(1, len(scenarios) + 1)]
+    fig_monthly = go.Figure()
+    totals = []
+    for label, ac_power in zip(labels, ac_powers):
+        monthly_kwh = energy_kwh(ac_power, 'ME')
+        fig_monthly.add_trace(go.Bar(x=monthly_kwh.index.strftime('%b'), y=monthly_kwh.values, name=label))
+        totals.append(html.Div(f"{label}: {energy_kwh(ac_power):,.0f} kWh"))
+    fig_monthly.update_layout(
+        title_text='Average Monthly Energy Production by Scenario',
+        yaxis_title='Energy (kWh)',
+        xaxis_title='Month',
+        barmode='group'
+    )
+
+    comparison = [
+        {'label': label, 'results': results_to_store(ac_power)} for label, ac_power in zip(labels, ac_powers)
+    ]
+    status = f"Comparing {len(scenarios)} scenarios for ZIP {configs[0].zip_code} (numbered as listed)."
+    return totals, fig_monthly, "", status, comparison
+
 
 # --- ADDED: New callback to update the daily graph from stored data ---
 @app.callback(
     Output('daily-graph', 'figure'),
     Input('results-store', 'data'),
+    Input('comparison-store', 'data'),
     Input('day-picker', 'date')
 )
-def update_daily_graph(json_data, selected_date):
-    # Only run if there is data in the store
-    if json_data is None:
+def update_daily_graph(stored_results, comparison, selected_date):
+    # A comparison on screen takes precedence over the single result
+    if comparison:
+        series = [(c['label'], results_from_store(c['results'])) for c in comparison]
+    elif stored_results is not None:
+        # Rebuild the series in the system's local time, so days run midnight to midnight
+        series = [('Hourly Production', results_from_store(stored_results))]
+    else:
         return go.Figure().update_layout(title_text='Select a day to view its hourly profile')
 
-    # Convert the stored JSON back to a pandas Series
-    ac_power = pd.read_json(json_data, orient='split', typ='series')
-    # The index is now a datetime object, so convert it to timezone-aware
-    ac_power.index = pd.to_datetime(ac_power.index, utc=True)
-
     # Filter for the selected day
     selected_dt = pd.to_datetime(selected_date)
-    daily_data = ac_power[ac_power.index.date == selected_dt.date()]
 
     # Create the line chart figure
     fig_daily = go.Figure()
-    if daily_data.empty:
+    for label, ac_power in series:
+        daily_data = ac_power[ac_power.index.date == selected_dt.date()]
+        if daily_data.empty:
+            continue
+        fig_daily.add_trace(go.Scatter(
+            # Fractional hours so sub-hourly data plots on the same axis
+            x=daily_data.index.hour + daily_data.index.minute / 60,
+            y=daily_data.values,
+            mode='lines+markers',
+            name=label
+        ))
+    if not fig_daily.data:
         fig_daily.update_layout(title_text=f'No production data for {selected_dt.strftime("%b %d")}')
         return fig_daily
 
-    fig_daily.add_trace(go.Scatter(
-        x=daily_data.index.hour,
-        y=daily_data.values,
-        mode='lines+markers',
-        name='Hourly Production'
-    ))
     fig_daily.update_layout(
         title_text=f'Hourly Power Production on {selected_dt.strftime("%b %d")}',
         yaxis_title='Power (W)',
@@ -235,5 +469,16 @@ def update_daily_graph(json_data, selected_date):
 
 
 # --- Run the application ---
+DEBUG = True
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    # With the debug reloader the script runs twice; only warm the process that serves requests
+    if not DEBUG or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        if getattr(config, "TRACK_MEMORY", False):
+            start_tracking()
+        data_store = get_store()
+        data_store.cleanup_temp_files()
+        data_store.enforce_retention()
+        cache_warmer = CacheWarmer(get_warm_zips()).start()
+        warm_pool()
+    app.run(debug=DEBUG)
\ No newline at end of file
@@ -0,0 +1,259 @@
+"""
+Managed storage for the per-ZIP data files kept under DATA_DIR.
+
+DataFrames are stored as Parquet with zstd compression. An hourly TMY drops from
+about 500 KB as CSV to about 100 KB, and loads roughly 15x faster because the
+timestamps don't need parsing. CSV files written by older versions are converted
+the first time they are read; until then they are in the manifest (and subject
+to retention) like any other file.
+
+Every stored file is recorded in a manifest (manifest.json in the store's root)
+with its size, when it was written and when it was last used. Retention:
+  - files unused for more than DATA_MAX_AGE_DAYS are deleted,
+  - then least recently used files are deleted until the store is under DATA_MAX_SIZE_MB,
+  - temp files left behind by interrupted downloads are removed after TEMP_MAX_AGE_HOURS.
+Both limits can be set in config.py. Deleted weather is simply downloaded again
+the next time it is needed.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+import config
+from config import DATA_DIR
+
+COMPRESSION = "zstd"
+COMPRESSION_LEVEL = 9
+
+DATA_MAX_AGE_DAYS = getattr(config, "DATA_MAX_AGE_DAYS", 180)
+DATA_MAX_SIZE_MB = getattr(config, "DATA_MAX_SIZE_MB", 2048)
+
+# Leftovers of interrupted downloads and debug output, relative to the store's root
+TEMP_PATTERNS = ["nrel_temp_*", "nrel_data_temp_*", "openweather_hourly_forecast_*", "**/*.parquet.*.tmp"]
+TEMP_MAX_AGE_HOURS = 1
+
+# Data files older versions wrote as CSV, relative to the store's root. Other CSVs
+# in DATA_DIR (e.g. uszips.csv) are inputs and never touched.
+LEGACY_CSV_PATTERNS = ["nrel_tmy_*.csv", "nrel_raw/nrel_*.csv"]
+
+# The manifest is updated in memory and saved at most this often (and at exit).
+# Files missing from it after a crash are picked up again when the store is opened.
+MANIFEST_SAVE_SECONDS = 60
+
+
+class DataStore:
+    """
+    Stores DataFrames under root as compressed Parquet and keeps the manifest.
+    Paths passed in are full paths ending in .parquet. Thread-safe.
+    """
+    def __init__(self, root: Path):
+        self.root = Path(root).resolve()
+        self.manifest_path = self.root / "manifest.json"
+        self._lock = threading.RLock()
+        self._deleted = set()  # keys deleted since the manifest was last saved
+        self._last_save = 0.0
+        self.entries = self._load_manifest()
+        atexit.register(self.save_manifest)
+
+    # --- Manifest ---
+    def _key(self, path: Path) -> str:
+        return Path(path).resolve().relative_to(self.root).as_posix()
+
+    def _read_manifest_file(self) -> dict:
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError) as e:
+            print(f"Could not read storage manifest, rebuilding it: {e}")
+            return {}
+
+    def _load_manifest(self) -> dict:
+        entries = self._read_manifest_file()
+        # Pick up files the manifest doesn't know about (e.g. it was deleted)
+        if self.root.exists():
+            paths = list(self.root.rglob("*.parquet"))
+            for pattern in LEGACY_CSV_PATTERNS:
+                paths += self.root.glob(pattern)
+            for path in paths:
+                key = self._key(path)
+                if key not in entries:
+                    stat = path.stat()
+                    entries[key] = {"bytes": stat.st_size, "written": stat.st_mtime, "last_used": stat.st_mtime}
+        return entries
+
+    def save_manifest(self):
+        """
+        Writes the manifest, merging in entries another process (e.g. a second
+        dashboard worker) saved in the meantime.
+        """
+        with self._lock:
+            if not self.root.exists():
+                # Removed on purpose (e.g. a temporary store); don't recreate it
+                return
+            merged = self._read_manifest_file()
+            for key in self._deleted:
+                merged.pop(key, None)
+            for key, entry in self.entries.items():
+                on_disk = merged.get(key)
+                if on_disk is not None and on_disk["written"] == entry["written"]:
+                    entry["last_used"] = max(entry["last_used"], on_disk["last_used"])
+                merged[key] = entry
+            merged = {key: entry for key, entry in merged.items() if (self.root / key).exists()}
+
+            temp_path = self.manifest_path.with_name(f"manifest.{uuid.uuid4().hex}.tmp")
+            temp_path.write_text(json.dumps(merged, indent=1, sort_keys=True))
+            os.replace(temp_path, self.manifest_path)
+            self.entries = merged
+            self._deleted.clear()
+            self._last_save = time.monotonic()
+
+    def _save_if_due(self):
+        if time.monotonic() - self._last_save > MANIFEST_SAVE_SECONDS:
+            self.save_manifest()
+
+    def _touch(self, path: Path):
+        with self._lock:
+            entry = self.entries.get(self._key(path))
+            if entry is not None:
+                entry["last_used"] = time.time()
+            self._save_if_due()
+
+    # --- Reading and writing ---
+    def exists(self, path: Path) -> bool:
+        """True if the file is stored, or an older CSV version of it exists."""
+        return path.exists() or path.with_suffix(".csv").exists()
+
+    def write(self, path: Path, df: pd.DataFrame):
+        """Writes df atomically, records it in the manifest and enforces the size limit."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        df.to_parquet(temp_path, compression=COMPRESSION, compression_level=COMPRESSION_LEVEL)
+        os.replace(temp_path, path)
+
+        now = time.time()
+        with self._lock:
+            key = self._key(path)
+            self._deleted.discard(key)
+            self.entries[key] = {"bytes": path.stat().st_size, "written": now, "last_used": now}
+            if self.total_bytes() > DATA_MAX_SIZE_MB * 1024 ** 2:
+                self.enforce_retention()
+            else:
+                self._save_if_due()
+
+    def _migrate_csv(self, path: Path) -> bool:
+        """Converts an older CSV version of path to Parquet. Returns False if there is none."""
+        csv_path = path.with_suffix(".csv")
+        if not csv_path.exists():
+            return False
+        print(f"Converting {csv_path.name} to compressed storage...")
+        self.write(path, pd.read_csv(csv_path, index_col=0, parse_dates=True))
+        self.delete(csv_path)
+        return True
+
+    def read(self, path: Path, columns: list[str] | None = None) -> pd.DataFrame | None:
+        """Reads a stored DataFrame, or returns None if it doesn't exist."""
+        if not path.exists() and not self._migrate_csv(path):
+            return None
+        try:
+            df = pd.read_parquet(path, columns=columns)
+        except FileNotFoundError:
+            # Deleted by retention between the check and the read
+            return None
+        self._touch(path)
+        return df
+
+    def iter_batches(self, path: Path, rows: int, columns: list[str] | None = None):
+        """Yields a stored DataFrame in pieces of about `rows` rows, without loading all of it."""
+        if not path.exists() and not self._migrate_csv(path):
+            return
+        parquet_file = pq.ParquetFile(path)
+        index_columns = [c for c in parquet_file.schema_arrow.pandas_metadata["index_columns"] if isinstance(c, str)]
+        read_columns = None if columns is None else columns + index_columns
+        for batch in parquet_file.iter_batches(batch_size=rows, columns=read_columns):
+            yield batch.to_pandas()
+        self._touch(path)
+
+    def delete(self, path: Path):
+        with self._lock:
+            path.unlink(missing_ok=True)
+            key = self._key(path)
+            self.entries.pop(key, None)
+            self._deleted.add(key)
+
+    # --- Retention ---
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(entry["bytes"] for entry in self.entries.values())
+
+    def enforce_retention(self, max_age_days: float = None, max_size_mb: float = None) -> list[str]:
+        """
+        Deletes files unused for more than max_age_days, then least recently used
+        files until the store is under max_size_mb. Returns the deleted keys.
+        """
+        max_age_days = DATA_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        max_size_mb = DATA_MAX_SIZE_MB if max_size_mb is None else max_size_mb
+        deleted = []
+        with self._lock:
+            oldest_allowed = time.time() - max_age_days * 86400
+            by_last_use = sorted(self.entries.items(), key=lambda item: item[1]["last_used"])
+            total = self.total_bytes()
+            for key, entry in by_last_use:
+                if entry["last_used"] >= oldest_allowed and total <= max_size_mb * 1024 ** 2:
+                    break
+                self.delete(self.root / key)
+                total -= entry["bytes"]
+                deleted.append(key)
+            self.save_manifest()
+        if deleted:
+            print(f"Storage retention deleted {len(deleted)} files; {total / 1024 ** 2:.1f} MB in use.")
+        return deleted
+
+    def cleanup_temp_files(self, max_age_hours: float = TEMP_MAX_AGE_HOURS) -> list[Path]:
+        """Removes temp files older than max_age_hours (younger ones may still be in use)."""
+        oldest_allowed = time.time() - max_age_hours * 3600
+        removed = []
+        for pattern in TEMP_PATTERNS:
+            for path in self.root.glob(pattern):
+                try:
+                    if path.is_file() and path.stat().st_mtime < oldest_allowed:
+                        path.unlink()
+                        removed.append(path)
+                except FileNotFoundError:
+                    pass
+        if removed:
+            print(f"Removed {len(removed)} stale temp files from {self.root}.")
+        return removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"files": len(self.entries), "mb": round(self.total_bytes() / 1024 ** 2, 2),
+                    "max_mb": DATA_MAX_SIZE_MB, "max_age_days": DATA_MAX_AGE_DAYS}
+
+
+# One store per root directory
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(root: Path = DATA_DIR) -> DataStore:
+    root = Path(root).resolve()
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = DataStore(root)
+        return _stores[root]
+
+
+# Test
+if __name__ == "__main__":
+    store = get_store()
+    store.cleanup_temp_files()
+    store.enforce_retention()
+    print(store.stats())
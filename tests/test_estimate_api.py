@@ -0,0 +1,33 @@
+# Allows tests located in "tests" subdirectory to import modules in "scripts"######################
+import path_to_scripts
+path_to_scripts.path_to_scripts()
+###################################################################################################
+
+from flask import Flask
+from estimate_api import register_estimate_api
+
+app = Flask(__name__)
+register_estimate_api(app)
+client = app.test_client()
+
+system = {"zip_code": "83333", "system_capacity_kw": 7.5, "tilt_deg": 25, "tracking_type": "fixed"}
+
+# The first request runs the model and returns an ETag
+first = client.post("/estimate", json=system)
+assert first.status_code == 200, first.get_json()
+result = first.get_json()
+print(f"Annual: {result['annual_kwh']:,.1f} kWh, ETag: {first.headers['ETag']}")
+assert list(result["monthly_kwh"]) == [f"{month:02d}" for month in range(1, 13)]
+assert abs(sum(result["monthly_kwh"].values()) - result["annual_kwh"]) < 1.0
+
+# Repeating it with that ETag gets 304 without running the model again
+second = client.post("/estimate", json=system, headers={"If-None-Match": first.headers["ETag"]})
+assert second.status_code == 304, second.status_code
+
+# Batches report errors per system; null fields use the defaults
+batch = client.post("/estimate/batch", json={"systems": [
+    {**system, "tilt_deg": None, "hourly": "float32"},
+    {**system, "tracking_type": "two-axis"},
+]}).get_json()["results"]
+assert batch[0]["config"]["tilt_deg"] == 20.0 and batch[0]["hourly"]["encoding"] == "float32"
+assert "error" in batch[1]
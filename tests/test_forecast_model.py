@@ -0,0 +1,37 @@
+# Allows tests located in "tests" subdirectory to import modules in "scripts"######################
+import path_to_scripts
+path_to_scripts.path_to_scripts()
+###################################################################################################
+
+import numpy as np
+import pandas as pd
+import forecast_model
+from SystemConfig import SystemConfig
+
+system_config = SystemConfig(
+    zip_code="83333",                   # Hailey,ID
+    system_capacity_kw=7.5,
+    module_efficiency=0.20,
+    system_losses=0.14,
+    tilt_deg=25,
+    azimuth_deg=180,
+    tracking_type="fixed",
+    max_angle=90
+)
+
+# 48 hours in the format fetch_openweather returns, so this runs without an OpenWeather key
+timestamps = pd.date_range(pd.Timestamp.now(tz="UTC").floor("h").tz_localize(None), periods=48, freq="h")
+forecast_df = pd.DataFrame({
+    "timestamp": timestamps,
+    "temperature": 15.0,
+    "cloud_cover": np.arange(48) * 7 % 100,
+    "wind_speed": 3.0,
+})
+
+weather = forecast_model.forecast_to_weather(forecast_df, forecast_model.get_location(system_config))
+assert (weather[["ghi", "dni", "dhi"]] >= 0).all().all()
+print(weather.head(24))
+
+ac_power = forecast_model.run_model_on_weather(system_config, weather)
+print(f"Forecast 48-hour generation: {ac_power.sum() / 1000:,.1f} kWh")
+assert len(ac_power) == 48 and ac_power.sum() > 0
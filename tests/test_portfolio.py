@@ -0,0 +1,33 @@
+# Allows tests located in "tests" subdirectory to import modules in "scripts"######################
+import path_to_scripts
+path_to_scripts.path_to_scripts()
+###################################################################################################
+
+import pandas as pd
+import portfolio
+import run_pvlib
+from SystemConfig import SystemConfig
+
+systems = pd.DataFrame({
+    "zip_code": ["83333", "83333", "83702"],
+    "system_capacity_kw": [7.5, 5.0, 10.0],
+    "tilt_deg": [25, 25, 20],
+    "azimuth_deg": [180, 180, 180],
+    "tracking_type": ["fixed", "fixed", "single-axis"],
+    "utility": ["Idaho Power", "Idaho Power", "Idaho Power"],
+})
+
+results = portfolio.run_portfolio(systems)
+print(results["utility"]["monthly"].round(0))
+
+# The fleet total should match running each system on its own
+individual_kwh = sum(
+    run_pvlib.run_pvlib_model(SystemConfig(
+        zip_code=row.zip_code, system_capacity_kw=row.system_capacity_kw, module_efficiency=0.20,
+        system_losses=0.14, tilt_deg=row.tilt_deg, azimuth_deg=row.azimuth_deg,
+        tracking_type=row.tracking_type, max_angle=60
+    )).sum() / 1000
+    for row in systems.itertuples()
+)
+print(f"Fleet: {results['fleet']['hourly'].sum():,.1f} kWh, individual runs: {individual_kwh:,.1f} kWh")
+assert abs(results["fleet"]["hourly"].sum() - individual_kwh) < 1e-6 * individual_kwh
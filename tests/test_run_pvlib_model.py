@@ -13,7 +13,7 @@ from SystemConfig import SystemConfig
 #     system_losses=0.14,                 # 14% system losses
 #     tilt_deg=25,                        # 25 degree tilt for fixed systems
 #     azimuth_deg=180,                    # 180 (South) for fixed systems
-#     tracking_type="single-axis",         # Options: 'fixed', 'single-axis','two-axis'
+#     tracking_type="single-axis",         # Options: 'fixed', 'single-axis', 'dual-axis'
 #     max_angle=90
 # )
 
@@ -24,9 +24,29 @@ system_config = SystemConfig(
     system_losses=0.14,                 # 14% system losses
     tilt_deg=25,                        # 25 degree tilt for fixed systems
     azimuth_deg=180,                    # 180 (South) for fixed systems
-    tracking_type="fixed",         # Options: 'fixed', 'single-axis','two-axis'
+    tracking_type="fixed",         # Options: 'fixed', 'single-axis', 'dual-axis'
     max_angle=90
 )
 
 
-results = run_pvlib.run_pvlib_model(system_config)
\ No newline at end of file
+results = run_pvlib.run_pvlib_model(system_config)
+# Dual-axis trackers follow the sun, so they should out-produce the fixed system
+dual_axis_config = SystemConfig(
+    zip_code="83333", system_capacity_kw=7.5, module_efficiency=0.20, system_losses=0.14,
+    tilt_deg=25, azimuth_deg=180, tracking_type="dual-axis", max_angle=90
+)
+fixed_kwh = run_pvlib.energy_kwh(results)
+dual_axis_kwh = run_pvlib.energy_kwh(run_pvlib.run_pvlib_model(dual_axis_config))
+print(f"Fixed: {fixed_kwh:,.0f} kWh, dual-axis: {dual_axis_kwh:,.0f} kWh")
+assert dual_axis_kwh > fixed_kwh
+
+# Unknown tracking types are rejected
+try:
+    SystemConfig(
+        zip_code="83333", system_capacity_kw=7.5, module_efficiency=0.20, system_losses=0.14,
+        tilt_deg=25, azimuth_deg=180, tracking_type="two-axis", max_angle=90
+    )
+except ValueError as e:
+    print(f"Rejected: {e}")
+else:
+    raise AssertionError("tracking_type 'two-axis' should be rejected")